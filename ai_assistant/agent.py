@@ -1,32 +1,227 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Sequence
+from pydantic import PrivateAttr
 from llama_index.core import PromptTemplate
-from llama_index.core.agent import ReActAgent
+from llama_index.core.agent import AgentRunner, ReActAgent
+from llama_index.core.agent.react.formatter import (
+    ReActChatFormatter,
+    get_react_tool_descriptions,
+)
+from llama_index.core.agent.react.types import (
+    BaseReasoningStep,
+    ObservationReasoningStep,
+)
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.tools import BaseTool
+from ai_assistant.config import get_agent_settings
+from ai_assistant.rags import get_llm, get_summary_llm
+from ai_assistant.memory import RollingSummaryMemory, truncate_tokens
+from ai_assistant.prompts import parallel_actions_str
+from ai_assistant.parallel_agent import ParallelReActAgentWorker, get_tool_executor
 from ai_assistant.tools import (
     travel_guide_tool,
     flight_tool,
     hotel_tool,
     bus_tool,
     restaurant_tool,
+    batch_tool,
     trip_summary_tool,
+    find_reservations_tool,
     department_info_tool,
+    location_digest_tool,
 )
 
+SETTINGS = get_agent_settings()
 
-class TravelAgent:
-    def __init__(self, system_prompt: PromptTemplate | None = None):
-        self.agent = ReActAgent.from_tools(
-            [
-                travel_guide_tool,
-                flight_tool,
-                hotel_tool,
-                bus_tool,
-                restaurant_tool,
-                trip_summary_tool,
-                department_info_tool,
-            ],
-            verbose=True,
+
+class CachedReActChatFormatter(ReActChatFormatter):
+    """
+    ReAct chat formatter that renders the system header once per tool set and
+    prompt instead of on every reasoning step. With `observation_digest_tokens`,
+    every observation but the latest is cut to that many tokens.
+    """
+
+    observation_digest_tokens: int | None = None
+
+    _rendered_headers: dict[tuple[str, str, tuple[str, ...]], str] = PrivateAttr(default_factory=dict)
+
+    def render_system_header(self, tools: Sequence[BaseTool]) -> str:
+        tool_names = tuple(tool.metadata.get_name() for tool in tools)
+        # update_prompts replaces system_header and context on the formatter.
+        key = (self.system_header, self.context, tool_names)
+        if key not in self._rendered_headers:
+            format_args = {
+                "tool_desc": "\n".join(get_react_tool_descriptions(tools)),
+                "tool_names": ", ".join(tool_names),
+            }
+            if self.context:
+                format_args["context"] = self.context
+            self._rendered_headers[key] = self.system_header.format(**format_args)
+        return self._rendered_headers[key]
+
+    def format(
+        self,
+        tools: Sequence[BaseTool],
+        chat_history: list[ChatMessage],
+        current_reasoning: list[BaseReasoningStep] | None = None,
+    ) -> list[ChatMessage]:
+        current_reasoning = current_reasoning or []
+        observations = [
+            i for i, step in enumerate(current_reasoning) if isinstance(step, ObservationReasoningStep)
+        ]
+        reasoning_history = []
+        for i, reasoning_step in enumerate(current_reasoning):
+            content = reasoning_step.get_content()
+            if isinstance(reasoning_step, ObservationReasoningStep):
+                role = MessageRole.USER
+                if self.observation_digest_tokens and i != observations[-1]:
+                    content = truncate_tokens(content, self.observation_digest_tokens)
+            else:
+                role = MessageRole.ASSISTANT
+            reasoning_history.append(ChatMessage(role=role, content=content))
+
+        return [
+            ChatMessage(role=MessageRole.SYSTEM, content=self.render_system_header(tools)),
+            *chat_history,
+            *reasoning_history,
+        ]
+
+
+def add_parallel_actions(system_header: str) -> str:
+    marker = "    ## Current Conversation"
+    if marker in system_header:
+        return system_header.replace(marker, parallel_actions_str + marker, 1)
+    return system_header + parallel_actions_str
+
+
+class AgentFactory:
+    """
+    Builds the tool set and the system prompt once and creates cheap agents
+    that share them, each one with its own chat memory. In the "parallel"
+    mode agents run the independent tool calls of a step concurrently.
+    """
+
+    def __init__(self, system_prompt: PromptTemplate | None = None, mode: str = "react"):
+        self.mode = mode
+        self.tools = [
+            travel_guide_tool,
+            flight_tool,
+            hotel_tool,
+            bus_tool,
+            restaurant_tool,
+            batch_tool,
+            trip_summary_tool,
+            find_reservations_tool,
+            department_info_tool,
+            location_digest_tool,
+        ]
+        self.llm = get_llm()
+        self.chat_formatter = CachedReActChatFormatter(
+            observation_digest_tokens=SETTINGS.agent_observation_digest_tokens
         )
         if system_prompt is not None:
-            self.agent.update_prompts({"agent_worker:system_prompt": system_prompt})
+            self.chat_formatter.system_header = system_prompt.get_template()
+        if mode == "parallel":
+            self.chat_formatter.system_header = add_parallel_actions(self.chat_formatter.system_header)
+        self.chat_formatter.render_system_header(self.tools)
+
+    def create_memory(self) -> RollingSummaryMemory:
+        return RollingSummaryMemory(
+            llm=get_summary_llm(),
+            token_limit=SETTINGS.agent_memory_token_limit,
+            summary_token_limit=SETTINGS.agent_memory_summary_tokens,
+        )
+
+    def create_agent(self) -> AgentRunner:
+        if self.mode == "parallel":
+            worker = ParallelReActAgentWorker(
+                tools=self.tools,
+                llm=self.llm,
+                react_chat_formatter=self.chat_formatter,
+                verbose=SETTINGS.agent_verbose,
+                executor=get_tool_executor(SETTINGS.agent_tool_workers),
+                tool_timeouts=SETTINGS.agent_tool_timeouts,
+                default_tool_timeout=SETTINGS.agent_default_tool_timeout,
+            )
+            return AgentRunner(
+                worker,
+                memory=self.create_memory(),
+                llm=self.llm,
+                verbose=SETTINGS.agent_verbose,
+            )
+
+        return ReActAgent(
+            tools=self.tools,
+            llm=self.llm,
+            memory=self.create_memory(),
+            react_chat_formatter=self.chat_formatter,
+            verbose=SETTINGS.agent_verbose,
+        )
+
+
+_agent_factories: dict[tuple[str | None, str], AgentFactory] = {}
+_agent_factories_lock = threading.Lock()
+
+
+def get_agent_factory(
+    system_prompt: PromptTemplate | None = None, mode: str | None = None
+) -> AgentFactory:
+    mode = mode or SETTINGS.agent_mode
+    key = (system_prompt.get_template() if system_prompt is not None else None, mode)
+    with _agent_factories_lock:
+        if key not in _agent_factories:
+            _agent_factories[key] = AgentFactory(system_prompt, mode)
+        return _agent_factories[key]
+
+
+class AgentSessionStore:
+    """
+    Keeps one agent per session id, expiring sessions idle for longer than
+    `ttl` seconds and evicting the least recently used above `max_sessions`.
+    """
+
+    def __init__(self, factory: AgentFactory, ttl: float, max_sessions: int):
+        self.factory = factory
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, tuple[AgentRunner, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get(self, session_id: str | None = None) -> AgentRunner:
+        if session_id is None:
+            return self.factory.create_agent()
+
+        with self._lock:
+            now = time.monotonic()
+            entry = self._sessions.pop(session_id, None)
+            if entry is None or now - entry[1] > self.ttl:
+                agent = self.factory.create_agent()
+            else:
+                agent = entry[0]
+            self._sessions[session_id] = (agent, now)
+            self._evict(now)
+            return agent
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class TravelAgent:
+    def __init__(self, system_prompt: PromptTemplate | None = None, mode: str | None = None):
+        self.agent = get_agent_factory(system_prompt, mode).create_agent()
 
-    def get_agent(self) -> ReActAgent:
+    def get_agent(self) -> AgentRunner:
         return self.agent
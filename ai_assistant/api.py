@@ -1,65 +1,343 @@
-from fastapi import FastAPI, Depends, Query, Body
+import re
+from functools import cache
+from typing import AsyncIterator, Awaitable, Callable, Literal
+from datetime import date
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Query, Body, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from llama_index.core.agent import ReActAgent
-from ai_assistant.agent import TravelAgent
-from ai_assistant.models import AgentAPIResponse
+from ai_assistant.agent import AgentSessionStore, get_agent_factory
+from ai_assistant.models import (
+    AgentAPIResponse,
+    BatchReservationResult,
+    ReservationPage,
+    ReservationRequest,
+)
+from ai_assistant.streaming import (
+    agent_event_stream,
+    agent_events,
+    event_stream,
+    text_events,
+    token_events,
+)
+from ai_assistant.pipeline import RecommendationPipeline, get_recommendation_pipeline
+from ai_assistant.cache import ResponseCache, get_response_cache, make_cache_key
+from ai_assistant.digests import LocationDigests, get_location_digests
+from ai_assistant.trip_summary import get_trip_summary_view
 from ai_assistant.tools import (
     reserve_flight,
     reserve_bus,
     reserve_hotel,
     reserve_restaurant,
+    reserve_batch,
+    find_reservations,
 )
 from ai_assistant.prompts import agent_prompt_tpl
+from ai_assistant.rags import awarm_up
+from ai_assistant.config import get_agent_settings
+from ai_assistant.logs import configure_logging
+from ai_assistant.metrics import REGISTRY, observe_request
+from ai_assistant.llm_gateway import GatewayOverloaded
+
+SETTINGS = get_agent_settings()
+
+configure_logging(SETTINGS.log_level, SETTINGS.log_format)
+
+
+@cache
+def get_agent_sessions() -> AgentSessionStore:
+    return AgentSessionStore(
+        get_agent_factory(agent_prompt_tpl),
+        ttl=SETTINGS.agent_session_ttl,
+        max_sessions=SETTINGS.agent_max_sessions,
+    )
+
+
+def get_agent(
+    x_session_id: str | None = Header(None, description="Optional chat session id"),
+) -> ReActAgent:
+    return get_agent_sessions().get(x_session_id)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SETTINGS.warm_start:
+        await awarm_up()
+    get_agent_sessions()
+    yield
+
+
+app = FastAPI(title="AI Agent", lifespan=lifespan)
 
-def get_agent() -> ReActAgent:
-    return TravelAgent(agent_prompt_tpl).get_agent()
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    return await observe_request(request, call_next, timing_header=SETTINGS.metrics_timing_header)
 
-app = FastAPI(title="AI Agent")
+
+@app.exception_handler(GatewayOverloaded)
+async def llm_overloaded(request: Request, exc: GatewayOverloaded):
+    # Shed load quickly instead of queueing more work behind the LLM.
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 agent_dependency = Depends(get_agent)
 
+CITIES_PROMPT = "recommend cities in bolivia with the following notes: {notes}"
+PLACES_PROMPT = "Recomienda lugares para visitar en {city}."
+HOTELS_PROMPT = "Recomienda hoteles para alojarse en {city}."
+ACTIVITIES_PROMPT = "Recomienda actividades interesantes para realizar en {city}."
+TRIP_REPORT_PROMPT = "Genera un reporte detallado del viaje basado en las reservas realizadas."
+
+
+def build_recommendation_prompt(template: str, city: str, notes: list[str] | None) -> str:
+    prompt = template.format(city=city)
+    if notes:
+        prompt += f" Considera las siguientes notas: {', '.join(notes)}."
+    return prompt
+
+
+steps_query = Query(False, description="Also stream intermediate Thought/Action events")
+
+
+def get_cache(
+    x_session_id: str | None = Header(None, description="Optional chat session id"),
+) -> ResponseCache | None:
+    # Answers inside a session depend on its chat history, never share them.
+    return None if x_session_id is not None else get_response_cache()
+
+
+cache_dependency = Depends(get_cache)
+
+
+def get_pipeline(
+    x_session_id: str | None = Header(None, description="Optional chat session id"),
+) -> RecommendationPipeline | None:
+    # The pipeline is stateless, sessions keep going through their agent.
+    return None if x_session_id is not None else get_recommendation_pipeline()
+
+
+pipeline_dependency = Depends(get_pipeline)
+
+
+def get_digests(
+    x_session_id: str | None = Header(None, description="Optional chat session id"),
+) -> LocationDigests | None:
+    # Digest answers ignore the chat history, sessions keep going through their agent.
+    if x_session_id is not None or not SETTINGS.location_digests:
+        return None
+    return get_location_digests()
+
+
+digest_dependency = Depends(get_digests)
+
+
+def uses_pipeline(endpoint: str, pipeline: RecommendationPipeline | None) -> bool:
+    return pipeline is not None and endpoint in SETTINGS.pipeline_endpoints
+
+
+async def generate(
+    endpoint: str,
+    prompt: str,
+    agent: ReActAgent,
+    pipeline: RecommendationPipeline | None,
+    city: str | None,
+) -> str:
+    if uses_pipeline(endpoint, pipeline):
+        return await pipeline.arun(prompt, city)
+    return str(await agent.achat(prompt))
+
+
+def generate_events(
+    endpoint: str,
+    prompt: str,
+    request: Request,
+    steps: bool,
+    agent: ReActAgent,
+    pipeline: RecommendationPipeline | None,
+    city: str | None,
+    on_complete: Callable[[str], Awaitable[None]] | None = None,
+) -> AsyncIterator[str]:
+    if uses_pipeline(endpoint, pipeline):
+        return token_events(pipeline.astream(prompt, city), request, on_complete)
+    return agent_events(agent, prompt, request, steps, on_complete)
+
+
+async def recommend(
+    endpoint: str,
+    prompt: str,
+    agent: ReActAgent,
+    cache: ResponseCache | None,
+    pipeline: RecommendationPipeline | None,
+    city: str | None = None,
+    notes: list[str] | None = None,
+    digests: LocationDigests | None = None,
+) -> AgentAPIResponse:
+    answer = digests.answer(endpoint, city, notes) if digests is not None else None
+    if answer is not None:
+        return AgentAPIResponse(status="OK", agent_response=answer)
+
+    if cache is None:
+        response = await generate(endpoint, prompt, agent, pipeline, city)
+        return AgentAPIResponse(status="OK", agent_response=response)
+
+    key = make_cache_key(endpoint, city, notes)
+    scope = make_cache_key(endpoint, city)
+    cached = await cache.aget(scope, key, prompt)
+    if cached is not None:
+        return AgentAPIResponse(status="OK", agent_response=cached)
+
+    response = await generate(endpoint, prompt, agent, pipeline, city)
+    await cache.aset(scope, key, response, prompt)
+    return AgentAPIResponse(status="OK", agent_response=response)
+
+
+async def recommend_stream(
+    endpoint: str,
+    prompt: str,
+    request: Request,
+    steps: bool,
+    agent: ReActAgent,
+    cache: ResponseCache | None,
+    pipeline: RecommendationPipeline | None,
+    city: str | None = None,
+    notes: list[str] | None = None,
+    digests: LocationDigests | None = None,
+) -> StreamingResponse:
+    answer = digests.answer(endpoint, city, notes) if digests is not None else None
+    if answer is not None:
+        return event_stream(text_events(answer))
+
+    if cache is None:
+        return event_stream(generate_events(endpoint, prompt, request, steps, agent, pipeline, city))
+
+    key = make_cache_key(endpoint, city, notes)
+    scope = make_cache_key(endpoint, city)
+    cached = await cache.aget(scope, key, prompt)
+    if cached is not None:
+        return event_stream(text_events(cached))
+
+    async def store(response: str):
+        await cache.aset(scope, key, response, prompt)
+
+    return event_stream(
+        generate_events(endpoint, prompt, request, steps, agent, pipeline, city, on_complete=store)
+    )
+
+
 @app.get("/recommendations/cities")
-def recommend_cities(
-    notes: list[str] = Query(...), agent: ReActAgent = agent_dependency
+async def recommend_cities(
+    notes: list[str] = Query(...),
+    agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
 ):
-    prompt = f"recommend cities in bolivia with the following notes: {notes}"
-    return AgentAPIResponse(status="OK", agent_response=str(agent.chat(prompt)))
+    prompt = CITIES_PROMPT.format(notes=notes)
+    return await recommend("cities", prompt, agent, cache, pipeline, notes=notes)
+
+@app.get("/recommendations/cities/stream")
+async def recommend_cities_stream(
+    request: Request,
+    notes: list[str] = Query(...),
+    steps: bool = steps_query,
+    agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
+):
+    prompt = CITIES_PROMPT.format(notes=notes)
+    return await recommend_stream("cities", prompt, request, steps, agent, cache, pipeline, notes=notes)
 
 @app.get("/recommendations/places")
-def recommend_places(
+async def recommend_places(
     city: str = Query(..., description="City to get recommendations for"),
     notes: list[str] = Query(None, description="Optional notes to guide the recommendations"),
     agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
+    digests: LocationDigests | None = digest_dependency,
 ):
-    prompt = f"Recomienda lugares para visitar en {city}."
-    if notes:
-        prompt += f" Considera las siguientes notas: {', '.join(notes)}."
-    response = agent.chat(prompt)
-    return AgentAPIResponse(status="OK", agent_response=str(response))
+    prompt = build_recommendation_prompt(PLACES_PROMPT, city, notes)
+    return await recommend("places", prompt, agent, cache, pipeline, city, notes, digests)
+
+@app.get("/recommendations/places/stream")
+async def recommend_places_stream(
+    request: Request,
+    city: str = Query(..., description="City to get recommendations for"),
+    notes: list[str] = Query(None, description="Optional notes to guide the recommendations"),
+    steps: bool = steps_query,
+    agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
+    digests: LocationDigests | None = digest_dependency,
+):
+    prompt = build_recommendation_prompt(PLACES_PROMPT, city, notes)
+    return await recommend_stream(
+        "places", prompt, request, steps, agent, cache, pipeline, city, notes, digests
+    )
 
 @app.get("/recommendations/hotels")
-def recommend_hotels(
+async def recommend_hotels(
     city: str = Query(..., description="City to get hotel recommendations for"),
     notes: list[str] = Query(None, description="Optional notes to guide the recommendations"),
     agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
+    digests: LocationDigests | None = digest_dependency,
 ):
-    prompt = f"Recomienda hoteles para alojarse en {city}."
-    if notes:
-        prompt += f" Considera las siguientes notas: {', '.join(notes)}."
-    response = agent.chat(prompt)
-    return AgentAPIResponse(status="OK", agent_response=str(response))
+    prompt = build_recommendation_prompt(HOTELS_PROMPT, city, notes)
+    return await recommend("hotels", prompt, agent, cache, pipeline, city, notes, digests)
+
+@app.get("/recommendations/hotels/stream")
+async def recommend_hotels_stream(
+    request: Request,
+    city: str = Query(..., description="City to get hotel recommendations for"),
+    notes: list[str] = Query(None, description="Optional notes to guide the recommendations"),
+    steps: bool = steps_query,
+    agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
+    digests: LocationDigests | None = digest_dependency,
+):
+    prompt = build_recommendation_prompt(HOTELS_PROMPT, city, notes)
+    return await recommend_stream(
+        "hotels", prompt, request, steps, agent, cache, pipeline, city, notes, digests
+    )
 
 @app.get("/recommendations/activities")
-def recommend_activities(
+async def recommend_activities(
     city: str = Query(..., description="City to get activity recommendations for"),
     notes: list[str] = Query(None, description="Optional notes to guide the recommendations"),
     agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
+    digests: LocationDigests | None = digest_dependency,
 ):
-    prompt = f"Recomienda actividades interesantes para realizar en {city}."
-    if notes:
-        prompt += f" Considera las siguientes notas: {', '.join(notes)}."
-    response = agent.chat(prompt)
-    return AgentAPIResponse(status="OK", agent_response=str(response))
+    prompt = build_recommendation_prompt(ACTIVITIES_PROMPT, city, notes)
+    return await recommend("activities", prompt, agent, cache, pipeline, city, notes, digests)
+
+@app.get("/recommendations/activities/stream")
+async def recommend_activities_stream(
+    request: Request,
+    city: str = Query(..., description="City to get activity recommendations for"),
+    notes: list[str] = Query(None, description="Optional notes to guide the recommendations"),
+    steps: bool = steps_query,
+    agent: ReActAgent = agent_dependency,
+    cache: ResponseCache | None = cache_dependency,
+    pipeline: RecommendationPipeline | None = pipeline_dependency,
+    digests: LocationDigests | None = digest_dependency,
+):
+    prompt = build_recommendation_prompt(ACTIVITIES_PROMPT, city, notes)
+    return await recommend_stream(
+        "activities", prompt, request, steps, agent, cache, pipeline, city, notes, digests
+    )
 
 @app.post("/reserve/flight")
 def reserve_flight_endpoint(
@@ -102,8 +380,80 @@ def reserve_restaurant_endpoint(
     return {"status": "OK", "reservation": reservation.model_dump()}
 
 
+@app.post("/reserve/batch", response_model=BatchReservationResult)
+def reserve_batch_endpoint(
+    reservations: list[ReservationRequest] = Body(
+        ..., embed=True, description="Flight, bus, hotel and restaurant reservations to make together"
+    ),
+):
+    result = reserve_batch(reservations)
+    if result.status != "OK":
+        raise HTTPException(status_code=422, detail=result.model_dump(mode="json"))
+    return result
+
+
+@app.get("/trip/reservations", response_model=ReservationPage)
+def trip_reservations(
+    city: str | None = Query(None, description="City of the reservation"),
+    from_date: date | None = Query(None, alias="from", description="First date to include"),
+    to_date: date | None = Query(None, alias="to", description="Last date to include"),
+    reservation_type: Literal["flight", "bus", "hotel", "restaurant"] | None = Query(
+        None, alias="type", description="Type of reservation"
+    ),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of reservations"),
+):
+    try:
+        return find_reservations(
+            city,
+            from_date.isoformat() if from_date else None,
+            to_date.isoformat() if to_date else None,
+            reservation_type,
+            cursor,
+            limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def trip_report_etag() -> str:
+    return f'"trip-{get_trip_summary_view().refresh()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches `etag` with the weak comparison of
+    RFC 9110: "*", or any of its comma separated entity tags, weak or strong,
+    with the same opaque tag.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in re.findall(r'(?:W/)?("[^"]*")', if_none_match)
+
+
 @app.get("/trip/report")
-def trip_report(agent: ReActAgent = agent_dependency):
-    prompt = "Genera un reporte detallado del viaje basado en las reservas realizadas."
-    response = agent.chat(prompt)
-    return AgentAPIResponse(status="OK", agent_response=str(response))
+async def trip_report(
+    request: Request, response: Response, agent: ReActAgent = agent_dependency
+):
+    etag = trip_report_etag()
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    agent_response = await agent.achat(TRIP_REPORT_PROMPT)
+    response.headers["ETag"] = etag
+    return AgentAPIResponse(status="OK", agent_response=str(agent_response))
+
+
+@app.get("/trip/report/stream")
+async def trip_report_stream(
+    request: Request, steps: bool = steps_query, agent: ReActAgent = agent_dependency
+):
+    etag = trip_report_etag()
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    stream = agent_event_stream(agent, TRIP_REPORT_PROMPT, request, steps)
+    stream.headers["ETag"] = etag
+    return stream
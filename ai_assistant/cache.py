@@ -0,0 +1,275 @@
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import cache
+from typing import Callable
+from ai_assistant.config import get_agent_settings
+from ai_assistant.rags import embed_query
+from ai_assistant.text import normalize_text
+from ai_assistant.metrics import RESPONSE_CACHE
+
+SETTINGS = get_agent_settings()
+
+
+def make_cache_key(endpoint: str, city: str | None = None, notes: list[str] | None = None) -> str:
+    normalized_notes = sorted({normalize_text(note) for note in notes or [] if note.strip()})
+    return json.dumps(
+        [endpoint, normalize_text(city) if city else None, normalized_notes],
+        ensure_ascii=False,
+    )
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: str) -> str | None:
+        """Returns the cached value, or None when missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """Stores a value, evicting entries above the size bound."""
+
+    @abstractmethod
+    def get_embeddings(self, scope: str) -> dict[str, np.ndarray]:
+        """Returns the query embeddings of the live entries of a scope, by key."""
+
+    @abstractmethod
+    def set_embedding(self, scope: str, key: str, embedding: np.ndarray) -> None:
+        """Stores the query embedding of an entry, dropped together with it."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._embeddings: dict[str, dict[str, np.ndarray]] = {}
+        self._scopes: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _drop_embedding(self, key: str):
+        scope = self._scopes.pop(key, None)
+        if scope is not None:
+            self._embeddings[scope].pop(key, None)
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                self._drop_embedding(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._drop_embedding(evicted)
+
+    def get_embeddings(self, scope: str) -> dict[str, np.ndarray]:
+        with self._lock:
+            return dict(self._embeddings.get(scope, {}))
+
+    def set_embedding(self, scope: str, key: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            if key not in self._entries:
+                return
+            self._drop_embedding(key)
+            self._embeddings.setdefault(scope, {})[key] = embedding
+            self._scopes[key] = scope
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    SQLite backed cache shared by every worker process on the host, query
+    embeddings included, so semantic hits work across workers.
+    """
+
+    def __init__(self, db_path: str, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_embeddings (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                embedding BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS response_embeddings_scope ON response_embeddings (scope)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.execute("DELETE FROM response_embeddings WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.execute(
+                "DELETE FROM response_embeddings WHERE key NOT IN (SELECT key FROM responses)"
+            )
+
+    def get_embeddings(self, scope: str) -> dict[str, np.ndarray]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT e.key, e.embedding FROM response_embeddings e
+                JOIN responses r ON r.key = e.key
+                WHERE e.scope = ? AND r.expires_at >= ?
+                """,
+                (scope, time.time()),
+            ).fetchall()
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    def set_embedding(self, scope: str, key: str, embedding: np.ndarray) -> None:
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_embeddings (key, scope, embedding) VALUES (?, ?, ?)",
+                (key, scope, blob),
+            )
+
+
+class ResponseCache:
+    """
+    Response cache in front of the recommendation endpoints. Lookups are exact
+    on the normalized key; in semantic mode a miss falls back to the closest
+    previous query in the same scope (endpoint and city) whose embedding
+    similarity is above `semantic_threshold`. Lookups are counted in the
+    metrics registry.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        embed_fn: Callable[[str], list[float]] | None = None,
+        semantic_threshold: float | None = None,
+    ):
+        self.backend = backend
+        self.embed_fn = embed_fn
+        self.semantic_threshold = semantic_threshold
+
+    @property
+    def semantic(self) -> bool:
+        return self.embed_fn is not None and self.semantic_threshold is not None
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(normalize_text(query)), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _closest_key(self, scope: str, query: str) -> str | None:
+        candidates = self.backend.get_embeddings(scope)
+        if not candidates:
+            return None
+
+        keys = list(candidates)
+        scores = np.stack([candidates[key] for key in keys]) @ self._embed(query)
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.semantic_threshold else None
+
+    def get(self, scope: str, key: str, query: str | None = None) -> str | None:
+        value = self.backend.get(key)
+        if value is not None:
+            RESPONSE_CACHE.inc(result="hit")
+            return value
+
+        if self.semantic and query:
+            similar_key = self._closest_key(scope, query)
+            if similar_key is not None:
+                value = self.backend.get(similar_key)
+        RESPONSE_CACHE.inc(result="miss" if value is None else "semantic_hit")
+        return value
+
+    def set(self, scope: str, key: str, value: str, query: str | None = None) -> None:
+        self.backend.set(key, value)
+        if self.semantic and query:
+            self.backend.set_embedding(scope, key, self._embed(query))
+
+    async def aget(self, scope: str, key: str, query: str | None = None) -> str | None:
+        # Semantic lookups run the embedding model, keep them off the event loop.
+        if self.semantic:
+            return await asyncio.to_thread(self.get, scope, key, query)
+        return self.get(scope, key, query)
+
+    async def aset(self, scope: str, key: str, value: str, query: str | None = None) -> None:
+        if self.semantic:
+            await asyncio.to_thread(self.set, scope, key, value, query)
+        else:
+            self.set(scope, key, value, query)
+
+
+@cache
+def get_response_cache() -> ResponseCache | None:
+    if SETTINGS.response_cache_backend == "none":
+        return None
+
+    if SETTINGS.response_cache_backend == "disk":
+        backend = DiskCacheBackend(
+            SETTINGS.response_cache_path,
+            ttl=SETTINGS.response_cache_ttl,
+            max_entries=SETTINGS.response_cache_max_entries,
+        )
+    else:
+        backend = MemoryCacheBackend(
+            ttl=SETTINGS.response_cache_ttl, max_entries=SETTINGS.response_cache_max_entries
+        )
+
+    return ResponseCache(
+        backend,
+        embed_fn=embed_query,
+        semantic_threshold=SETTINGS.response_cache_semantic_threshold,
+    )
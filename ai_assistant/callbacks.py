@@ -0,0 +1,88 @@
+import time
+import logging
+from typing import Any, Callable
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.callbacks.token_counting import get_llm_token_counts
+from llama_index.core.utilities.token_counting import TokenCounter
+from ai_assistant.metrics import LLM_PROMPT_TOKENS, LLM_TOKENS, TOOL_DURATION, record_stage
+
+logger = logging.getLogger(__name__)
+
+STAGES = {
+    CBEventType.AGENT_STEP: "agent_step",
+    CBEventType.LLM: "llm",
+    CBEventType.RETRIEVE: "retrieve",
+    CBEventType.EMBEDDING: "embedding",
+    CBEventType.FUNCTION_CALL: "tool",
+    CBEventType.SYNTHESIZE: "synthesize",
+}
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times LlamaIndex events (agent steps, LLM calls, retrieval, embeddings,
+    tool calls and synthesis) into the metrics registry and counts the prompt
+    and completion tokens of every LLM call.
+    """
+
+    def __init__(self, tokenizer: Callable[[str], list] | None = None):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self._token_counter = TokenCounter(tokenizer=tokenizer)
+        self._starts: dict[str, tuple[float, str | None]] = {}
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: dict[str, Any] | None = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        if event_type in STAGES:
+            tool = None
+            if event_type == CBEventType.FUNCTION_CALL and payload is not None:
+                tool = payload[EventPayload.TOOL].name
+            self._starts[event_id] = (time.perf_counter(), tool)
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: dict[str, Any] | None = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ) -> None:
+        start = self._starts.pop(event_id, None)
+        if start is None:
+            return
+        started, tool = start
+        elapsed = time.perf_counter() - started
+        record_stage(STAGES[event_type], elapsed)
+
+        if event_type == CBEventType.FUNCTION_CALL:
+            TOOL_DURATION.observe(elapsed, tool=tool)
+            logger.debug("tool call", extra={"tool": tool, "seconds": elapsed})
+        elif event_type == CBEventType.LLM and payload is not None:
+            usage = get_llm_token_counts(self._token_counter, payload, event_id)
+            LLM_TOKENS.inc(usage.prompt_token_count, kind="prompt")
+            LLM_TOKENS.inc(usage.completion_token_count, kind="completion")
+            LLM_PROMPT_TOKENS.observe(usage.prompt_token_count)
+            logger.debug(
+                "llm call",
+                extra={
+                    "prompt_tokens": usage.prompt_token_count,
+                    "completion_tokens": usage.completion_token_count,
+                    "seconds": elapsed,
+                },
+            )
+
+    def start_trace(self, trace_id: str | None = None) -> None:
+        pass
+
+    def end_trace(
+        self,
+        trace_id: str | None = None,
+        trace_map: dict[str, list[str]] | None = None,
+    ) -> None:
+        pass
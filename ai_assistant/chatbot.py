@@ -1,14 +1,50 @@
 import gradio as gr
-from ai_assistant.agent import TravelAgent
+from functools import cache
+from ai_assistant.agent import AgentSessionStore, get_agent_factory
 from ai_assistant.prompts import agent_prompt_tpl
+from ai_assistant.config import get_agent_settings
 
-agent = TravelAgent(agent_prompt_tpl).get_agent()
+SETTINGS = get_agent_settings()
 
 
-def agent_response(message, history):
-    return agent.chat(message).response
+@cache
+def get_chat_sessions() -> AgentSessionStore:
+    # One agent (and chat memory) per browser session, all built from the same tools.
+    return AgentSessionStore(
+        get_agent_factory(agent_prompt_tpl),
+        ttl=SETTINGS.agent_session_ttl,
+        max_sessions=SETTINGS.agent_max_sessions,
+    )
+
+
+async def agent_response(message: str, history: list[dict], request: gr.Request):
+    agent = get_chat_sessions().get(request.session_hash)
+    response = await agent.astream_chat(message)
+    answer = ""
+    async for token in response.async_response_gen():
+        answer += token
+        yield answer
+
+
+def end_session(request: gr.Request):
+    get_chat_sessions().drop(request.session_hash)
+
+
+def build_demo() -> gr.Blocks:
+    with gr.Blocks(title="AI Agent") as demo:
+        gr.ChatInterface(agent_response, type="messages")
+        demo.unload(end_session)
+
+    # Requests beyond the concurrency limit wait in the queue, which shows
+    # every user their position.
+    return demo.queue(
+        default_concurrency_limit=SETTINGS.chatbot_concurrency_limit,
+        max_size=SETTINGS.chatbot_queue_size,
+    )
+
+
+demo = build_demo()
 
 
 if __name__ == "__main__":
-    demo = gr.ChatInterface(agent_response, type="messages")
     demo.launch()
@@ -10,7 +10,69 @@ class AgentSettings(BaseSettings):
     travel_guide_store_path: str = "travel_guide_store"
     travel_guide_data_path: str = "data"
     openai_api_key: str = "key"
+    openai_api_base: str | None = None
+    llm_max_concurrency: int = 32
+    llm_model_concurrency: dict[str, int] = {}
+    llm_max_queue: int = 128
+    llm_queue_timeout: float = 30.0
+    llm_max_retries: int = 4
+    llm_retry_base_delay: float = 0.5
+    llm_retry_max_delay: float = 20.0
+    llm_timeout: float = 60.0
+    llm_http_max_connections: int = 64
+    llm_http_max_keepalive: int = 32
     log_file: str = "trip.json"
+    log_level: str = "INFO"
+    log_format: str = "json"
+    metrics_timing_header: bool = False
+    reservation_backend: str = "sqlite"
+    reservation_store_path: str | None = None
+    warm_start: bool = True
+    ingest_workers: int | None = None
+    ingest_embed_batch_size: int = 256
+    agent_session_ttl: int = 1800
+    agent_max_sessions: int = 256
+    chatbot_concurrency_limit: int = 8
+    chatbot_queue_size: int = 64
+    agent_mode: str = "react"
+    agent_verbose: bool = False
+    agent_tool_workers: int = 16
+    agent_default_tool_timeout: float = 30.0
+    agent_tool_timeouts: dict[str, float] = {"travel_guide": 60.0, "get_department_info": 20.0}
+    agent_memory_token_limit: int = 3000
+    agent_memory_summary_tokens: int = 300
+    agent_observation_digest_tokens: int | None = 300
+    memory_summary_model: str = "gpt-4o-mini"
+    embedding_backend: str = "torch"
+    embedding_onnx_path: str = "onnx_model"
+    embedding_onnx_int8: bool = True
+    embedding_cache_size: int = 2048
+    embedding_batch_window_ms: float = 5.0
+    embedding_max_batch_size: int = 32
+    department_cache_path: str = "department_cache.json"
+    department_cache_ttl: int = 30 * 24 * 3600
+    department_snapshot_path: str = "department_snapshot.json"
+    department_offline: bool = False
+    response_cache_backend: str = "memory"
+    response_cache_path: str = "response_cache.db"
+    response_cache_ttl: int = 3600
+    response_cache_max_entries: int = 1024
+    response_cache_semantic_threshold: float | None = None
+    vector_index_mode: str = "float32"
+    vector_rescore_factor: int = 4
+    retrieval_mode: str = "hybrid"
+    retrieval_top_k: int = 2
+    retrieval_candidate_k: int = 20
+    retrieval_dense_weight: float = 0.5
+    retrieval_service_url: str | None = None
+    retrieval_service_timeout: float = 30.0
+    retrieval_service_max_connections: int = 32
+    context_token_budget: int = 1500
+    location_digests: bool = True
+    digest_context_tokens: int = 8000
+    digest_workers: int = 4
+    context_duplicate_threshold: float = 0.8
+    pipeline_endpoints: list[str] = ["places", "hotels", "activities"]
 
 
 @cache
@@ -0,0 +1,136 @@
+import os
+import json
+import logging
+import time
+import threading
+import wikipedia
+from functools import cache
+from ai_assistant.config import get_agent_settings
+from ai_assistant.locations import DEPARTMENTS
+from ai_assistant.metrics import timed
+
+SETTINGS = get_agent_settings()
+
+logger = logging.getLogger(__name__)
+
+
+class DepartmentCache:
+    """
+    On-disk cache of department summaries with a TTL. Entries missing from the
+    cache are seeded from an optional pre-fetched snapshot file.
+    """
+
+    def __init__(self, path: str, ttl: float, snapshot_path: str | None = None):
+        self.path = path
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._entries = self._load(path)
+        if snapshot_path:
+            for department, entry in self._load(snapshot_path).items():
+                self._entries.setdefault(department, entry)
+
+    @staticmethod
+    def _load(path: str) -> dict[str, dict]:
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except json.JSONDecodeError:
+            logger.warning("could not parse department cache, ignoring it", extra={"path": path})
+            return {}
+
+    def get(self, department: str, allow_stale: bool = False) -> str | None:
+        entry = self._entries.get(department)
+        if entry is None:
+            return None
+        if not allow_stale and time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry["summary"]
+
+    def put(self, department: str, summary: str):
+        with self._lock:
+            self._entries[department] = {"summary": summary, "fetched_at": time.time()}
+            write_json_atomic(self.path, self._entries)
+
+
+def write_json_atomic(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def fetch_department_summary(department: str) -> str:
+    wikipedia.set_lang("es")
+    with timed("wikipedia"):
+        try:
+            page = wikipedia.page(DEPARTMENTS[department]["wikipedia_title"], auto_suggest=False)
+        except (wikipedia.exceptions.PageError, wikipedia.exceptions.DisambiguationError):
+            page = wikipedia.page(department + " (departamento de Bolivia)")
+        return page.summary
+
+
+@cache
+def get_department_cache() -> DepartmentCache:
+    return DepartmentCache(
+        SETTINGS.department_cache_path,
+        ttl=SETTINGS.department_cache_ttl,
+        snapshot_path=SETTINGS.department_snapshot_path,
+    )
+
+
+def get_department_summary(department: str) -> str:
+    """
+    Returns the summary of a canonical department name: from the cache while it
+    is fresh, otherwise from Wikipedia, falling back to a stale cache entry or
+    the snapshot when offline or when Wikipedia fails.
+    """
+    department_cache = get_department_cache()
+    summary = department_cache.get(department)
+    if summary is not None:
+        return summary
+
+    if not SETTINGS.department_offline:
+        try:
+            summary = fetch_department_summary(department)
+            department_cache.put(department, summary)
+            return summary
+        except Exception as e:
+            logger.warning(
+                "could not fetch department from Wikipedia",
+                extra={"department": department, "error": str(e)},
+            )
+
+    summary = department_cache.get(department, allow_stale=True)
+    if summary is None:
+        raise LookupError(f"No hay información disponible sin conexión para {department}.")
+    return summary
+
+
+def refresh_departments(snapshot_path: str) -> dict[str, dict]:
+    """
+    Fetches every department from Wikipedia and writes the snapshot file.
+    """
+    snapshot = {}
+    for department in DEPARTMENTS:
+        logger.info("fetching department", extra={"department": department})
+        snapshot[department] = {
+            "summary": fetch_department_summary(department),
+            "fetched_at": time.time(),
+        }
+    write_json_atomic(snapshot_path, snapshot)
+    return snapshot
+
+
+if __name__ == "__main__":
+    import sys
+    from ai_assistant.logs import configure_logging
+
+    configure_logging(SETTINGS.log_level, "text")
+
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else SETTINGS.department_snapshot_path
+    refresh_departments(snapshot_path)
+    write_json_atomic(SETTINGS.department_cache_path, DepartmentCache._load(snapshot_path))
+    print(f"wrote {snapshot_path} and {SETTINGS.department_cache_path}")
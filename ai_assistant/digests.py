@@ -0,0 +1,284 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from llama_index.core.llms import LLM
+from llama_index.core.schema import BaseNode
+from ai_assistant.config import get_agent_settings
+from ai_assistant.locations import CITIES, CITY_ALIASES, DEPARTMENTS, resolve_department
+from ai_assistant.memory import count_tokens, truncate_tokens
+from ai_assistant.models import ActivityGroup, GuideDigest, LocationDigest
+from ai_assistant.prompts import location_digest_tpl
+from ai_assistant.retrieval import LocationIndex, node_text, write_json
+from ai_assistant.store_versions import resolve_store_dir
+from ai_assistant.text import normalize_text
+
+SETTINGS = get_agent_settings()
+
+DIGESTS_FNAME = "location_digests.json"
+
+logger = logging.getLogger(__name__)
+
+# Digest fields answering each recommendation endpoint; the first one must be
+# present for the digest to cover the request.
+ENDPOINT_SECTIONS = {
+    "places": ("places", "suggested_stay", "best_season"),
+    "hotels": ("hotels",),
+    "activities": ("activities", "best_season"),
+}
+ALL_SECTIONS = ("places", "suggested_stay", "restaurants", "hotels", "activities", "best_season")
+
+
+def _name_key(item: str) -> str:
+    # "Hotel Rosario: céntrico" and "Hotel Rosario" are the same hotel.
+    return normalize_text(item.split(":", 1)[0])
+
+
+def _unique(items: list[str]) -> list[str]:
+    seen = {}
+    for item in items:
+        seen.setdefault(_name_key(item), item.strip())
+    return [item for item in seen.values() if item]
+
+
+def merge_digests(digests: list[GuideDigest]) -> GuideDigest:
+    """
+    Combines partial digests, keeping the first mention of every place, hotel,
+    restaurant and activity type.
+    """
+    activities: dict[str, ActivityGroup] = {}
+    for digest in digests:
+        for group in digest.activities:
+            merged = activities.setdefault(normalize_text(group.type), ActivityGroup(type=group.type))
+            merged.activities = _unique(merged.activities + group.activities)
+    return GuideDigest(
+        places=_unique([place for digest in digests for place in digest.places]),
+        hotels=_unique([hotel for digest in digests for hotel in digest.hotels]),
+        restaurants=_unique([restaurant for digest in digests for restaurant in digest.restaurants]),
+        activities=[group for group in activities.values() if group.activities],
+        best_season=next((digest.best_season for digest in digests if digest.best_season), None),
+        suggested_stay=next((digest.suggested_stay for digest in digests if digest.suggested_stay), None),
+    )
+
+
+def batch_texts(texts: list[str], max_tokens: int) -> list[list[str]]:
+    """
+    Groups consecutive texts into batches of at most `max_tokens` tokens.
+    """
+    batches, batch, used = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if tokens > max_tokens:
+            text, tokens = truncate_tokens(text, max_tokens), max_tokens
+        if batch and used + tokens > max_tokens:
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(text)
+        used += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def extract_digest(llm: LLM, location: str, texts: list[str], max_tokens: int) -> GuideDigest:
+    """
+    Extracts the digest of `location` from its guide texts, one LLM call per
+    batch of texts that fits in `max_tokens`.
+    """
+    return merge_digests(
+        [
+            llm.structured_predict(
+                GuideDigest, location_digest_tpl, location=location, context_str="\n\n".join(batch)
+            )
+            for batch in batch_texts(texts, max_tokens)
+        ]
+    )
+
+
+class LocationDigests:
+    """
+    Digests of the travel guide for every city and department, built at ingest
+    time so the common recommendation requests need no retrieval nor synthesis.
+    """
+
+    def __init__(self, cities: dict[str, LocationDigest], departments: dict[str, LocationDigest]):
+        self.cities = cities
+        self.departments = departments
+
+    def get(self, name: str) -> LocationDigest | None:
+        """
+        Returns the digest of a city, or of a department when `name` is not a
+        city, in any case or accentuation.
+        """
+        key = normalize_text(name)
+        if key in CITY_ALIASES:
+            return self.cities.get(key)
+        department = resolve_department(name)
+        return self.departments.get(department) if department is not None else None
+
+    def answer(self, endpoint: str, city: str | None, notes: list[str] | None) -> str | None:
+        """
+        Answers a recommendation endpoint from the digest of `city`, or returns
+        None when the digest does not cover it. Notes ask for specifics only
+        the full guide can answer.
+        """
+        if notes or not city or endpoint not in ENDPOINT_SECTIONS:
+            return None
+        digest = self.get(city)
+        sections = ENDPOINT_SECTIONS[endpoint]
+        if digest is None or not getattr(digest, sections[0]):
+            return None
+        return render_digest(digest, sections)
+
+    def persist(self, store_dir: str):
+        write_json(
+            os.path.join(store_dir, DIGESTS_FNAME),
+            {
+                "cities": {key: digest.model_dump() for key, digest in self.cities.items()},
+                "departments": {key: digest.model_dump() for key, digest in self.departments.items()},
+            },
+        )
+
+    @classmethod
+    def load(cls, store_dir: str) -> "LocationDigests":
+        path = os.path.join(store_dir, DIGESTS_FNAME)
+        if not os.path.exists(path):
+            return cls({}, {})
+        with open(path, "r") as file:
+            data = json.load(file)
+        return cls(
+            {key: LocationDigest.model_validate(digest) for key, digest in data["cities"].items()},
+            {key: LocationDigest.model_validate(digest) for key, digest in data["departments"].items()},
+        )
+
+
+def render_digest(digest: LocationDigest, sections: tuple[str, ...] = ALL_SECTIONS) -> str:
+    """
+    Renders the given sections of a digest in the format of the travel guide
+    answers.
+    """
+    header = "Ciudad" if digest.kind == "city" else "Departamento"
+    lines = [f"{header}: {digest.name}"]
+    tips = []
+    for section in sections:
+        if section == "places" and digest.places:
+            lines.append("- Lugares para visitar: " + ", ".join(digest.places))
+        elif section == "suggested_stay" and digest.suggested_stay:
+            lines.append(f"- Duración de Estadía Sugerida: {digest.suggested_stay}")
+        elif section == "restaurants" and digest.restaurants:
+            lines.append("- Restaurantes: " + "; ".join(digest.restaurants))
+        elif section == "hotels" and digest.hotels:
+            lines.append("- Hoteles: " + "; ".join(digest.hotels))
+        elif section == "activities":
+            for group in digest.activities:
+                lines.append(f"- Actividades ({group.type}): " + ", ".join(group.activities))
+        elif section == "best_season" and digest.best_season:
+            tips.append(f"- Mejor Temporada para Visitar: {digest.best_season}")
+    if tips:
+        lines += ["", "Consejos adicionales:", *tips]
+    return "\n".join(lines)
+
+
+def build_location_digests(
+    nodes: dict[str, BaseNode],
+    locations: LocationIndex,
+    store_dir: str,
+    llm: LLM,
+    max_tokens: int = 8000,
+    workers: int = 4,
+) -> LocationDigests:
+    """
+    Builds and persists the digests of every city and department of the
+    location index. Digests in `store_dir` whose source nodes did not change
+    are kept. A department digest merges the digests of its cities and is
+    only extracted from the guide when none of them has one.
+    """
+    previous = LocationDigests.load(store_dir)
+
+    def extract(name: str, kind: str, department: str, node_ids: list[str], old: LocationDigest | None):
+        if old is not None and old.source_node_ids == node_ids:
+            return old
+        texts = [node_text(nodes[node_id]) for node_id in node_ids if node_id in nodes]
+        try:
+            digest = extract_digest(llm, name, texts, max_tokens)
+        except Exception as e:
+            # The location falls back to the full guide at request time.
+            logger.warning("could not build location digest", extra={"location": name, "error": str(e)})
+            return None
+        logger.info("built location digest", extra={"location": name, "nodes": len(node_ids)})
+        return LocationDigest(
+            name=name, kind=kind, department=department, source_node_ids=node_ids, **digest.model_dump()
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            key: pool.submit(
+                extract,
+                CITY_ALIASES[key],
+                "city",
+                CITIES[CITY_ALIASES[key]],
+                node_ids,
+                previous.cities.get(key),
+            )
+            for key, node_ids in locations.cities.items()
+        }
+        cities = {key: future.result() for key, future in futures.items()}
+        cities = {key: digest for key, digest in cities.items() if digest is not None}
+
+        departments = {}
+        futures = {}
+        for department in DEPARTMENTS:
+            parts = [digest for digest in cities.values() if digest.department == department]
+            if parts:
+                departments[department] = LocationDigest(
+                    name=department,
+                    kind="department",
+                    department=department,
+                    source_node_ids=[node_id for part in parts for node_id in part.source_node_ids],
+                    **merge_digests(parts).model_dump(),
+                )
+            elif department in locations.departments:
+                futures[department] = pool.submit(
+                    extract,
+                    department,
+                    "department",
+                    department,
+                    locations.departments[department],
+                    previous.departments.get(department),
+                )
+        for department, future in futures.items():
+            if (digest := future.result()) is not None:
+                departments[department] = digest
+
+    digests = LocationDigests(cities, departments)
+    digests.persist(store_dir)
+    return digests
+
+
+@cache
+def get_location_digests() -> LocationDigests:
+    return LocationDigests.load(resolve_store_dir(SETTINGS.travel_guide_store_path))
+
+
+if __name__ == "__main__":
+    import sys
+    from llama_index.core import load_index_from_storage
+    from ai_assistant.logs import configure_logging
+    from ai_assistant.rags import get_llm, load_storage_context
+    from ai_assistant.retrieval import load_retrieval_indexes
+
+    configure_logging(SETTINGS.log_level, "text")
+
+    store_path = resolve_store_dir(sys.argv[1] if len(sys.argv) > 1 else SETTINGS.travel_guide_store_path)
+    index = load_index_from_storage(load_storage_context(store_path))
+    _, locations = load_retrieval_indexes(index, store_path)
+    digests = build_location_digests(
+        index.docstore.docs,
+        locations,
+        store_path,
+        get_llm(),
+        max_tokens=SETTINGS.digest_context_tokens,
+        workers=SETTINGS.digest_workers,
+    )
+    print(f"built {len(digests.cities)} city and {len(digests.departments)} department digests")
@@ -0,0 +1,222 @@
+import os
+import copy
+import json
+import sqlite3
+import hashlib
+import threading
+from llama_index.core.storage.kvstore.types import BaseKVStore, DEFAULT_COLLECTION
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+
+DOCSTORE_FNAME = "docstore.sqlite"
+
+# Metadata written by SimpleDirectoryReader that is identical for every node of a file.
+SHARED_METADATA_KEYS = (
+    "file_path",
+    "file_name",
+    "file_type",
+    "file_size",
+    "creation_date",
+    "last_modified_date",
+    "last_accessed_date",
+)
+SHARED_FIELDS = ("excluded_embed_metadata_keys", "excluded_llm_metadata_keys")
+NODE_METADATA = "__node_metadata__"
+
+
+def _split_shared(val: dict) -> tuple[dict | None, dict]:
+    """
+    Splits the repeated per-file metadata out of a stored docstore value.
+    """
+    val = copy.deepcopy(val)
+    target = val.get("__data__", val)
+    if not isinstance(target, dict) or not isinstance(target.get("metadata"), dict):
+        return None, val
+
+    metadata = target["metadata"]
+    full_metadata = dict(metadata)
+    shared = {
+        "metadata": {key: metadata.pop(key) for key in SHARED_METADATA_KEYS if key in metadata}
+    }
+    for field in SHARED_FIELDS:
+        if field in target:
+            shared[field] = target.pop(field)
+
+    # Source relationships usually carry a full copy of the node metadata.
+    for relation in target.get("relationships", {}).values():
+        if isinstance(relation, dict) and relation.get("metadata") == full_metadata:
+            relation["metadata"] = NODE_METADATA
+
+    return shared, val
+
+
+def _merge_shared(shared: dict | None, val: dict) -> dict:
+    target = val.get("__data__", val)
+    if shared is None or not isinstance(target, dict):
+        return val
+
+    target["metadata"] = {**target.get("metadata", {}), **shared["metadata"]}
+    for field in SHARED_FIELDS:
+        if field in shared:
+            target[field] = list(shared[field])
+
+    for relation in target.get("relationships", {}).values():
+        if isinstance(relation, dict) and relation.get("metadata") == NODE_METADATA:
+            relation["metadata"] = dict(target["metadata"])
+
+    return val
+
+
+class SQLiteKVStore(BaseKVStore):
+    """
+    Key-value store backed by SQLite. Values are read on demand by key and the
+    metadata shared by all nodes of a source file is stored only once.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._shared_cache: dict[int, dict] = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS shared_metadata (
+                id INTEGER PRIMARY KEY,
+                hash TEXT UNIQUE NOT NULL,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS kv (
+                collection TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                shared_id INTEGER REFERENCES shared_metadata(id),
+                PRIMARY KEY (collection, key)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _shared_id(self, shared: dict | None) -> int | None:
+        if shared is None:
+            return None
+
+        blob = json.dumps(shared, sort_keys=True)
+        digest = hashlib.sha256(blob.encode()).hexdigest()
+        self._conn.execute(
+            "INSERT OR IGNORE INTO shared_metadata (hash, value) VALUES (?, ?)", (digest, blob)
+        )
+        row = self._conn.execute(
+            "SELECT id FROM shared_metadata WHERE hash = ?", (digest,)
+        ).fetchone()
+        return row[0]
+
+    def _shared(self, shared_id: int | None) -> dict | None:
+        if shared_id is None:
+            return None
+        if shared_id not in self._shared_cache:
+            row = self._conn.execute(
+                "SELECT value FROM shared_metadata WHERE id = ?", (shared_id,)
+            ).fetchone()
+            self._shared_cache[shared_id] = json.loads(row[0])
+        return self._shared_cache[shared_id]
+
+    def _put_rows(self, kv_pairs: list[tuple[str, dict]], collection: str):
+        rows = []
+        for key, val in kv_pairs:
+            shared, stripped = _split_shared(val)
+            rows.append((collection, key, json.dumps(stripped), self._shared_id(shared)))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO kv (collection, key, value, shared_id) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection=collection)
+
+    def put_all(
+        self,
+        kv_pairs: list[tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = 1,
+    ) -> None:
+        with self._lock, self._conn:
+            self._put_rows(list(kv_pairs), collection)
+
+    async def aput_all(
+        self,
+        kv_pairs: list[tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = 1,
+    ) -> None:
+        self.put_all(kv_pairs, collection=collection, batch_size=batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, shared_id FROM kv WHERE collection = ? AND key = ?",
+                (collection, key),
+            ).fetchone()
+            if row is None:
+                return None
+            return _merge_shared(self._shared(row[1]), json.loads(row[0]))
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> dict | None:
+        return self.get(key, collection=collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, shared_id FROM kv WHERE collection = ?", (collection,)
+            ).fetchall()
+            return {
+                key: _merge_shared(self._shared(shared_id), json.loads(value))
+                for key, value, shared_id in rows
+            }
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> dict[str, dict]:
+        return self.get_all(collection=collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            )
+            return cursor.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection=collection)
+
+
+def sqlite_docstore_path(store_path: str) -> str:
+    return os.path.join(store_path, DOCSTORE_FNAME)
+
+
+def load_sqlite_docstore(store_path: str) -> KVDocumentStore:
+    return KVDocumentStore(SQLiteKVStore(sqlite_docstore_path(store_path)))
+
+
+def migrate_json_docstore(store_path: str) -> KVDocumentStore:
+    """
+    Imports a persisted docstore.json into the SQLite docstore of the same
+    store directory.
+    """
+    with open(os.path.join(store_path, "docstore.json"), "r") as file:
+        data = json.load(file)
+
+    kvstore = SQLiteKVStore(sqlite_docstore_path(store_path))
+    for collection, values in data.items():
+        kvstore.put_all(list(values.items()), collection=collection)
+
+    return KVDocumentStore(kvstore)
+
+
+if __name__ == "__main__":
+    import sys
+    from ai_assistant.store_versions import resolve_store_dir
+
+    store_path = resolve_store_dir(sys.argv[1] if len(sys.argv) > 1 else "travel_guide_store")
+    docstore = migrate_json_docstore(store_path)
+    print(f"migrated docstore.json into {sqlite_docstore_path(store_path)}")
@@ -0,0 +1,232 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from pydantic import PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from ai_assistant.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE, record_stage
+
+ONNX_MODEL_FNAME = "model.onnx"
+ONNX_INT8_MODEL_FNAME = "model_quantized.onnx"
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+
+class MicroBatcher:
+    """
+    Collects concurrent query embeddings for up to `window` seconds or
+    `max_batch_size` queries and runs them through `embed_batch` in one call.
+    The size and latency of every batch are recorded in the metrics registry.
+    """
+
+    def __init__(self, embed_batch, window: float, max_batch_size: int):
+        self.embed_batch = embed_batch
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: list[tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, query: str) -> Future:
+        future = Future()
+        with self._cond:
+            self._pending.append((query, future))
+            self._cond.notify()
+        return future
+
+    def _next_batch(self) -> list[tuple[str, Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            start = time.perf_counter()
+            try:
+                embeddings = self.embed_batch([query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            record_stage("embedding_batch", time.perf_counter() - start)
+            EMBEDDING_BATCH_SIZE.observe(len(batch))
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result([float(value) for value in embedding])
+
+
+def query_batch_fn(embed_model: BaseEmbedding):
+    """
+    Returns a function embedding a list of queries in one forward pass. The
+    HuggingFace embedding exposes `_embed` for lists, other models fall back
+    to one call per query.
+    """
+    if embed_model.class_name() == "OptimumEmbedding":
+        from llama_index.embeddings.huggingface.utils import format_query
+
+        return lambda queries: embed_model._embed(
+            [format_query(query, embed_model.model_name, embed_model.query_instruction) for query in queries]
+        )
+    if hasattr(embed_model, "_embed"):
+        return lambda queries: embed_model._embed(queries, prompt_name="query")
+    return lambda queries: [embed_model.get_query_embedding(query) for query in queries]
+
+
+class CachedBatchingEmbedding(BaseEmbedding):
+    """
+    Wraps the configured embedding model with an LRU cache keyed on the
+    normalized query text and micro-batches query embeddings across threads.
+    Document embeddings go straight to the wrapped model.
+    """
+
+    cache_size: int = 2048
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _batcher: MicroBatcher = PrivateAttr()
+    _cache: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _cache_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        cache_size: int = 2048,
+        batch_window: float = 0.005,
+        max_batch_size: int = 32,
+    ):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            cache_size=cache_size,
+        )
+        self._embed_model = embed_model
+        self._batcher = MicroBatcher(
+            query_batch_fn(embed_model), window=batch_window, max_batch_size=max_batch_size
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedBatchingEmbedding"
+
+    def _cached(self, key: str) -> Embedding | None:
+        with self._cache_lock:
+            embedding = self._cache.get(key)
+            if embedding is None:
+                EMBEDDING_CACHE.inc(result="miss")
+                return None
+            EMBEDDING_CACHE.inc(result="hit")
+            self._cache.move_to_end(key)
+            return embedding
+
+    def _store(self, key: str, embedding: Embedding):
+        with self._cache_lock:
+            self._cache[key] = embedding
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = normalize_query(query)
+        embedding = self._cached(key)
+        if embedding is None:
+            embedding = self._batcher.submit(key).result()
+            self._store(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = normalize_query(query)
+        embedding = self._cached(key)
+        if embedding is None:
+            embedding = await asyncio.wrap_future(self._batcher.submit(key))
+            self._store(key, embedding)
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return self._embed_model._get_text_embeddings(texts)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._embed_model._aget_text_embedding(text)
+
+
+def export_onnx_model(model_name: str, output_dir: str, int8: bool = True):
+    """
+    Exports the HuggingFace model to ONNX in `output_dir` and, with `int8`,
+    adds a copy with dynamically quantized int8 weights.
+    """
+    from llama_index.embeddings.huggingface_optimum import OptimumEmbedding
+
+    OptimumEmbedding.create_and_save_optimum_model(model_name, output_dir)
+    if int8:
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        quantizer = ORTQuantizer.from_pretrained(output_dir, file_name=ONNX_MODEL_FNAME)
+        config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=output_dir, quantization_config=config)
+
+
+def load_onnx_embedding(model_name: str, model_dir: str, int8: bool = True) -> BaseEmbedding:
+    """
+    Runs `model_name` through ONNX Runtime, exporting it to `model_dir` on
+    first use. Requires `llama-index-embeddings-huggingface-optimum` and
+    `optimum[onnxruntime]`.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from llama_index.embeddings.huggingface_optimum import OptimumEmbedding
+    from llama_index.embeddings.huggingface.utils import (
+        get_query_instruct_for_model_name,
+        get_text_instruct_for_model_name,
+    )
+
+    file_name = ONNX_INT8_MODEL_FNAME if int8 else ONNX_MODEL_FNAME
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        logger.info("exporting embedding model to ONNX", extra={"model": model_name, "path": model_dir})
+        export_onnx_model(model_name, model_dir, int8=int8)
+
+    return OptimumEmbedding(
+        folder_name=model_dir,
+        model=ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=file_name),
+        # The sentence-transformers e5 models use mean pooling and instruction
+        # prefixes, which OptimumEmbedding cannot infer from a local folder.
+        pooling="mean",
+        normalize=True,
+        query_instruction=get_query_instruct_for_model_name(model_name),
+        text_instruction=get_text_instruct_for_model_name(model_name),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    from ai_assistant.config import get_agent_settings
+    from ai_assistant.logs import configure_logging
+
+    SETTINGS = get_agent_settings()
+    configure_logging(SETTINGS.log_level, "text")
+
+    parser = argparse.ArgumentParser(description="Exports the embedding model to ONNX")
+    parser.add_argument("output_dir", nargs="?", default=SETTINGS.embedding_onnx_path)
+    parser.add_argument("--no-int8", action="store_true", help="Skip the int8 quantized copy")
+    args = parser.parse_args()
+
+    export_onnx_model(SETTINGS.hf_embeddings_model, args.output_dir, int8=not args.no_int8)
+    print(f"exported {SETTINGS.hf_embeddings_model} to {args.output_dir}")
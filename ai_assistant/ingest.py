@@ -0,0 +1,309 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from llama_index.core import (
+    Document,
+    Settings,
+    SimpleDirectoryReader,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import BaseNode, MetadataMode, TextNode
+from ai_assistant.config import get_agent_settings
+from ai_assistant.docstore import load_sqlite_docstore
+from ai_assistant.rags import get_embed_model, get_llm, load_storage_context
+from ai_assistant.digests import build_location_digests
+from ai_assistant.retrieval import build_retrieval_indexes
+from ai_assistant.vector_store import MmapVectorStore
+from ai_assistant.store_versions import (
+    copy_store,
+    new_version_dir,
+    publish_version,
+    resolve_store_dir,
+    store_exists,
+)
+
+SETTINGS = get_agent_settings()
+
+MANIFEST_FNAME = "ingest_manifest.json"
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_sha256(document: Document) -> str:
+    return hashlib.sha256(document.get_content(metadata_mode=MetadataMode.NONE).encode()).hexdigest()
+
+
+def parse_file(path: str, rel_path: str) -> list[Document]:
+    """
+    Parses one source file into page documents with ids that stay stable
+    between runs. Runs inside the ingestion process pool.
+    """
+    documents = SimpleDirectoryReader(input_files=[path]).load_data()
+    for page_number, document in enumerate(documents):
+        document.id_ = f"{rel_path}_part_{page_number}"
+    return documents
+
+
+class IngestionPipeline:
+    """
+    Incremental ingestion of `data_dir` into the travel guide store.
+
+    Source files and their pages are hashed and recorded in a manifest kept in
+    the store, so only new or changed pages are parsed and embedded. Parsing
+    runs in a process pool, embeddings are computed in large batches and
+    checkpointed per file so a killed run resumes where it stopped. Changes are
+    applied to a new version of the store, together with the location digests
+    of the cities whose nodes changed, which then becomes the live one by an
+    atomic swap of the store's CURRENT pointer.
+    """
+
+    def __init__(
+        self,
+        store_path: str,
+        data_dir: str,
+        workers: int | None = None,
+        embed_batch_size: int = 256,
+        digests: bool = True,
+    ):
+        self.store_path = store_path
+        self.data_dir = data_dir
+        self.workers = workers
+        self.embed_batch_size = embed_batch_size
+        self.digests = digests
+        self.checkpoint_dir = store_path.rstrip(os.sep) + ".ingest"
+
+    def load_manifest(self) -> dict | None:
+        path = os.path.join(resolve_store_dir(self.store_path), MANIFEST_FNAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as file:
+            return json.load(file)
+
+    def scan(self) -> dict[str, str]:
+        files = {}
+        for root, _, names in os.walk(self.data_dir):
+            for name in sorted(names):
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, self.data_dir)] = file_sha256(path)
+        return files
+
+    def legacy_pages(self) -> dict[tuple[str, str], list[str]]:
+        """
+        Maps (file name, page label) to the ref doc ids of a store built before
+        the manifest existed, so its embeddings are adopted instead of redone.
+        """
+        if not store_exists(self.store_path):
+            return {}
+
+        docstore = load_storage_context(self.store_path).docstore
+        pages: dict[tuple[str, str], list[str]] = {}
+        for ref_doc_id, info in (docstore.get_all_ref_doc_info() or {}).items():
+            key = (info.metadata.get("file_name"), info.metadata.get("page_label"))
+            pages.setdefault(key, []).append(ref_doc_id)
+        return pages
+
+    def checkpoint_path(self, file_hash: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{file_hash}.json")
+
+    def load_checkpoint(self, file_hash: str) -> dict | None:
+        path = self.checkpoint_path(file_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as file:
+            checkpoint = json.load(file)
+        checkpoint["nodes"] = [TextNode.from_dict(node) for node in checkpoint["nodes"]]
+        return checkpoint
+
+    def save_checkpoint(self, file_hash: str, pages: dict, nodes: list[BaseNode]):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self.checkpoint_path(file_hash)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"pages": pages, "nodes": [node.to_dict() for node in nodes]}, file)
+        os.replace(path + ".tmp", path)
+
+    def embed(self, nodes: list[BaseNode]):
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embed_model = get_embed_model()
+        for start in range(0, len(texts), self.embed_batch_size):
+            batch = texts[start : start + self.embed_batch_size]
+            embeddings = embed_model.get_text_embedding_batch(batch, show_progress=True)
+            for node, embedding in zip(nodes[start : start + self.embed_batch_size], embeddings):
+                node.embedding = embedding
+
+    def process_file(
+        self,
+        rel_path: str,
+        file_hash: str,
+        documents: list[Document],
+        old_pages: dict,
+        legacy: dict[tuple[str, str], list[str]],
+    ) -> tuple[dict, list[BaseNode]]:
+        pages = {}
+        changed = []
+        for document in documents:
+            page_hash = page_sha256(document)
+            old_page = old_pages.get(document.id_)
+            legacy_ids = legacy.get(
+                (document.metadata.get("file_name"), document.metadata.get("page_label"))
+            )
+            if old_page is not None and old_page["hash"] == page_hash:
+                pages[document.id_] = old_page
+            elif old_page is None and legacy_ids:
+                pages[document.id_] = {"hash": page_hash, "ref_doc_ids": legacy_ids}
+            else:
+                pages[document.id_] = {"hash": page_hash, "ref_doc_ids": [document.id_]}
+                changed.append(document)
+
+        nodes = run_transformations(changed, Settings.transformations, show_progress=True)
+        self.embed(nodes)
+        self.save_checkpoint(file_hash, pages, nodes)
+        return pages, nodes
+
+    def commit(self, manifest: dict, removed_ref_doc_ids: list[str], nodes: list[BaseNode]):
+        exists = store_exists(self.store_path)
+        version_dir = new_version_dir(self.store_path)
+        if exists:
+            copy_store(self.store_path, version_dir)
+            index = load_index_from_storage(load_storage_context(version_dir))
+        else:
+            storage_context = StorageContext.from_defaults(
+                vector_store=MmapVectorStore(store_dir=version_dir),
+                docstore=load_sqlite_docstore(version_dir),
+            )
+            index = VectorStoreIndex([], storage_context=storage_context)
+
+        # One rewrite of the vectors for all the removals and insert batches.
+        vector_store = index.vector_store
+        bulk = vector_store.bulk_update() if isinstance(vector_store, MmapVectorStore) else nullcontext()
+        with bulk:
+            for ref_doc_id in removed_ref_doc_ids:
+                index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+            if nodes:
+                index.insert_nodes(nodes)
+
+        index.storage_context.persist(persist_dir=version_dir)
+        docs = index.docstore.docs
+        _, locations = build_retrieval_indexes(docs.values(), version_dir)
+        if self.digests:
+            build_location_digests(
+                docs,
+                locations,
+                version_dir,
+                get_llm(),
+                max_tokens=SETTINGS.digest_context_tokens,
+                workers=SETTINGS.digest_workers,
+            )
+        with open(os.path.join(version_dir, MANIFEST_FNAME), "w") as file:
+            json.dump(manifest, file)
+        publish_version(self.store_path, version_dir)
+
+    def run(self) -> dict[str, int]:
+        manifest = self.load_manifest()
+        legacy = self.legacy_pages() if manifest is None else {}
+        manifest = manifest or {"files": {}}
+        old_files = manifest["files"]
+
+        files = self.scan()
+        changed = {
+            rel_path: file_hash
+            for rel_path, file_hash in files.items()
+            if old_files.get(rel_path, {}).get("sha256") != file_hash
+        }
+        removed = [rel_path for rel_path in old_files if rel_path not in files]
+        if not changed and not removed:
+            logger.info("travel guide store is up to date")
+            return {"changed_files": 0, "removed_files": 0, "new_nodes": 0}
+
+        new_files = {rel_path: old_files[rel_path] for rel_path in files if rel_path not in changed}
+        removed_ref_doc_ids = [
+            ref_doc_id
+            for rel_path in removed
+            for page in old_files[rel_path]["pages"].values()
+            for ref_doc_id in page["ref_doc_ids"]
+        ]
+        nodes = []
+
+        checkpoints = {file_hash: self.load_checkpoint(file_hash) for file_hash in changed.values()}
+        to_parse = [rel_path for rel_path, file_hash in changed.items() if checkpoints[file_hash] is None]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            parsed = dict(
+                zip(
+                    to_parse,
+                    pool.map(
+                        parse_file,
+                        [os.path.join(self.data_dir, rel_path) for rel_path in to_parse],
+                        to_parse,
+                    ),
+                )
+            )
+
+        for rel_path, file_hash in changed.items():
+            old_pages = old_files.get(rel_path, {}).get("pages", {})
+            checkpoint = checkpoints[file_hash]
+            if checkpoint is not None:
+                logger.info("resuming from checkpoint", extra={"file": rel_path})
+                pages, file_nodes = checkpoint["pages"], checkpoint["nodes"]
+            else:
+                logger.info("ingesting", extra={"file": rel_path})
+                pages, file_nodes = self.process_file(
+                    rel_path, file_hash, parsed[rel_path], old_pages, legacy
+                )
+
+            for page_id, old_page in old_pages.items():
+                if pages.get(page_id) != old_page:
+                    removed_ref_doc_ids.extend(old_page["ref_doc_ids"])
+            new_files[rel_path] = {"sha256": file_hash, "pages": pages}
+            nodes.extend(file_nodes)
+
+        self.commit({"files": new_files}, removed_ref_doc_ids, nodes)
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        logger.info(
+            "committed ingestion",
+            extra={"new_nodes": len(nodes), "removed_documents": len(removed_ref_doc_ids)},
+        )
+        return {
+            "changed_files": len(changed),
+            "removed_files": len(removed),
+            "new_nodes": len(nodes),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    from ai_assistant.logs import configure_logging
+
+    configure_logging(SETTINGS.log_level, "text")
+
+    parser = argparse.ArgumentParser(description="Incrementally ingest the travel guide data")
+    parser.add_argument("--data-dir", default=SETTINGS.travel_guide_data_path)
+    parser.add_argument("--store-path", default=SETTINGS.travel_guide_store_path)
+    parser.add_argument("--workers", type=int, default=SETTINGS.ingest_workers)
+    parser.add_argument("--embed-batch-size", type=int, default=SETTINGS.ingest_embed_batch_size)
+    parser.add_argument("--no-digests", action="store_true", help="Do not build the location digests")
+    args = parser.parse_args()
+
+    IngestionPipeline(
+        args.store_path,
+        args.data_dir,
+        workers=args.workers,
+        embed_batch_size=args.embed_batch_size,
+        digests=SETTINGS.location_digests and not args.no_digests,
+    ).run()
@@ -0,0 +1,426 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import httpx
+import openai
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from contextlib import asynccontextmanager, contextmanager
+from functools import cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Sequence, TypeVar
+from pydantic import PrivateAttr
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+)
+from llama_index.llms.openai import OpenAI
+from ai_assistant.metrics import LLM_GATEWAY_EVENTS, record_stage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class GatewayOverloaded(Exception):
+    """
+    Raised when the LLM gateway wait queue is full or a request waited longer
+    than the queue timeout; the API answers it with a 503.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    Counting semaphore usable from threads and event loops alike, with a
+    bounded wait queue. A released slot is handed directly to the oldest
+    waiter, so waiters that time out or are cancelled never leak one.
+    """
+
+    def __init__(self, limit: int, max_waiting: int, timeout: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque[Callable[[], None]] = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, waiter: Callable[[], None]) -> bool:
+        """
+        Takes a free slot, or queues `waiter` to be called when one is handed
+        over. Raises GatewayOverloaded when the queue is full.
+        """
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return True
+            if len(self._waiters) >= self.max_waiting:
+                raise GatewayOverloaded("LLM wait queue is full")
+            self._waiters.append(waiter)
+            return False
+
+    def _cancel(self, waiter: Callable[[], None]) -> bool:
+        """
+        Removes a waiter from the queue, returns False if it was already
+        handed a slot.
+        """
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+            else:
+                self.active -= 1
+                return
+        # The slot stays taken and passes to the waiter.
+        waiter()
+
+    def acquire(self):
+        event = threading.Event()
+        if self._try_acquire(event.set):
+            return
+        if not event.wait(self.timeout) and self._cancel(event.set):
+            raise GatewayOverloaded("timed out waiting for an LLM slot", retry_after=self.timeout)
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def deliver():
+            if granted.done():
+                # The waiter gave up after the slot was handed over, pass it on.
+                self.release()
+            else:
+                granted.set_result(None)
+
+        def waiter():
+            loop.call_soon_threadsafe(deliver)
+
+        if self._try_acquire(waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if self._cancel(waiter):
+                granted.cancel()
+            elif not granted.done():
+                granted.cancel()  # `deliver` will release the slot.
+            else:
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise GatewayOverloaded("timed out waiting for an LLM slot", retry_after=self.timeout)
+            raise
+
+
+def retry_delay(error: Exception, attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Seconds to wait before retrying `error`: the server's Retry-After when
+    given, otherwise exponential backoff with full jitter.
+    """
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return min(max(float(value) * scale, 0.0), max_delay)
+        except ValueError:
+            # An HTTP date, fall back to the backoff.
+            break
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def request_key(model: str, messages: Sequence[ChatMessage], kwargs: dict[str, Any]) -> str:
+    payload = json.dumps(
+        [model, [message.model_dump() for message in messages], kwargs],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMGateway:
+    """
+    Admission control, in-flight request coalescing and retries shared by all
+    the LLM clients of the process: a global concurrency limit plus one per
+    model, each with a bounded wait queue, and a single request for identical
+    prompts that are in flight at the same time.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        model_concurrency: dict[str, int] | None = None,
+        max_waiting: int = 128,
+        queue_timeout: float = 30.0,
+        max_retries: int = 4,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 20.0,
+    ):
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.model_concurrency = model_concurrency or {}
+        self._global = Limiter(max_concurrency, max_waiting, queue_timeout)
+        self._models: dict[str, Limiter] = {}
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _limiters(self, model: str) -> list[Limiter]:
+        limiters = [self._global]
+        if model in self.model_concurrency:
+            with self._lock:
+                if model not in self._models:
+                    self._models[model] = Limiter(
+                        self.model_concurrency[model], self.max_waiting, self.queue_timeout
+                    )
+            limiters.insert(0, self._models[model])
+        return limiters
+
+    @contextmanager
+    def admit(self, model: str) -> Iterator[None]:
+        start = time.perf_counter()
+        acquired = []
+        try:
+            for limiter in self._limiters(model):
+                limiter.acquire()
+                acquired.append(limiter)
+        except GatewayOverloaded:
+            LLM_GATEWAY_EVENTS.inc(event="rejected", model=model)
+            for limiter in acquired:
+                limiter.release()
+            raise
+        record_stage("llm_queue", time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            for limiter in acquired:
+                limiter.release()
+
+    @asynccontextmanager
+    async def aadmit(self, model: str) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        acquired = []
+        try:
+            for limiter in self._limiters(model):
+                await limiter.aacquire()
+                acquired.append(limiter)
+        except BaseException as e:
+            if isinstance(e, GatewayOverloaded):
+                LLM_GATEWAY_EVENTS.inc(event="rejected", model=model)
+            for limiter in acquired:
+                limiter.release()
+            raise
+        record_stage("llm_queue", time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            for limiter in acquired:
+                limiter.release()
+
+    def _delay(self, error: Exception, attempt: int, model: str) -> float:
+        if attempt >= self.max_retries:
+            raise error
+        LLM_GATEWAY_EVENTS.inc(event="retried", model=model)
+        delay = retry_delay(error, attempt, self.retry_base_delay, self.retry_max_delay)
+        logger.info(
+            "retrying LLM request",
+            extra={"model": model, "attempt": attempt + 1, "delay": delay, "error": str(error)},
+        )
+        return delay
+
+    def retry(self, model: str, call: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self._delay(e, attempt, model))
+                attempt += 1
+
+    async def aretry(self, model: str, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self._delay(e, attempt, model))
+                attempt += 1
+
+    def _join(self, key: str) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException | None = None):
+        """
+        Resolves the shared future of `key`. Cancellations and other
+        non-errors of the leader are not passed on: the future is abandoned
+        and a follower takes over the request.
+        """
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            future.cancel()
+
+    def call(self, model: str, key: str, call: Callable[[], T]) -> T:
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            LLM_GATEWAY_EVENTS.inc(event="coalesced", model=model)
+            try:
+                return future.result()
+            except CancelledError:
+                # The leader gave up, take over the request.
+                continue
+        try:
+            with self.admit(model):
+                result = self.retry(model, call)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def acall(self, model: str, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            LLM_GATEWAY_EVENTS.inc(event="coalesced", model=model)
+            try:
+                # Shielded: a cancelled follower must not cancel the shared future.
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    # The leader was cancelled, take over the request.
+                    continue
+                raise
+        try:
+            async with self.aadmit(model):
+                result = await self.aretry(model, call)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+
+class GatewayOpenAI(OpenAI):
+    """
+    OpenAI LLM whose chat requests go through an LLMGateway. Streams hold
+    their slot until they are consumed and are retried only before the first
+    chunk; they are never coalesced. The client's own retries must be
+    disabled (`max_retries=0`), the gateway retries instead.
+    """
+
+    _gateway: LLMGateway = PrivateAttr()
+
+    def __init__(self, gateway: LLMGateway, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._gateway = gateway
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "GatewayOpenAI"
+
+    def _chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self._gateway.call(
+            self.model,
+            request_key(self.model, messages, kwargs),
+            lambda: super(GatewayOpenAI, self)._chat(messages, **kwargs),
+        )
+
+    async def _achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self._gateway.acall(
+            self.model,
+            request_key(self.model, messages, kwargs),
+            lambda: super(GatewayOpenAI, self)._achat(messages, **kwargs),
+        )
+
+    def _stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        gateway = self._gateway
+
+        def first_chunk() -> tuple[ChatResponse | None, ChatResponseGen]:
+            stream = super(GatewayOpenAI, self)._stream_chat(messages, **kwargs)
+            return next(stream, None), stream
+
+        def gen() -> ChatResponseGen:
+            with gateway.admit(self.model):
+                first, stream = gateway.retry(self.model, first_chunk)
+                if first is None:
+                    return
+                yield first
+                yield from stream
+
+        return gen()
+
+    async def _astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        gateway = self._gateway
+
+        async def first_chunk() -> tuple[ChatResponse | None, ChatResponseAsyncGen]:
+            stream = await super(GatewayOpenAI, self)._astream_chat(messages, **kwargs)
+            return await anext(stream, None), stream
+
+        async def gen() -> ChatResponseAsyncGen:
+            async with gateway.aadmit(self.model):
+                first, stream = await gateway.aretry(self.model, first_chunk)
+                if first is None:
+                    return
+                yield first
+                async for chunk in stream:
+                    yield chunk
+
+        return gen()
+
+
+@cache
+def get_http_clients(
+    max_connections: int, max_keepalive: int, timeout: float
+) -> tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Connection pools shared by every LLM client of the process.
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_keepalive, keepalive_expiry=60
+    )
+    timeouts = httpx.Timeout(timeout, connect=5.0)
+    return (
+        httpx.Client(limits=limits, timeout=timeouts),
+        httpx.AsyncClient(limits=limits, timeout=timeouts),
+    )
@@ -0,0 +1,160 @@
+import re
+from ai_assistant.text import normalize_text
+
+# Bolivian departments with their Spanish Wikipedia page and the names users
+# and the agent commonly use for them, including their capital cities.
+DEPARTMENTS = {
+    "La Paz": {
+        "wikipedia_title": "Departamento de La Paz (Bolivia)",
+        "aliases": ["la paz", "nuestra senora de la paz"],
+    },
+    "Cochabamba": {
+        "wikipedia_title": "Departamento de Cochabamba",
+        "aliases": ["cochabamba", "cbba"],
+    },
+    "Santa Cruz": {
+        "wikipedia_title": "Departamento de Santa Cruz",
+        "aliases": ["santa cruz", "santa cruz de la sierra", "scz"],
+    },
+    "Oruro": {
+        "wikipedia_title": "Departamento de Oruro",
+        "aliases": ["oruro"],
+    },
+    "Potosí": {
+        "wikipedia_title": "Departamento de Potosí",
+        "aliases": ["potosi", "villa imperial de potosi"],
+    },
+    "Chuquisaca": {
+        "wikipedia_title": "Departamento de Chuquisaca",
+        "aliases": ["chuquisaca", "sucre"],
+    },
+    "Tarija": {
+        "wikipedia_title": "Departamento de Tarija",
+        "aliases": ["tarija"],
+    },
+    "Beni": {
+        "wikipedia_title": "Departamento del Beni",
+        "aliases": ["beni", "el beni", "trinidad"],
+    },
+    "Pando": {
+        "wikipedia_title": "Departamento de Pando",
+        "aliases": ["pando", "cobija"],
+    },
+}
+
+DEPARTMENT_ALIASES = {
+    normalize_text(alias): department
+    for department, info in DEPARTMENTS.items()
+    for alias in [department, *info["aliases"]]
+}
+
+_DEPARTMENT_AFFIXES = re.compile(
+    r"^(el )?departamento (de |del )?|^department of |\(?(departamento de )?bolivia\)?$|,? bolivia$"
+)
+
+
+def resolve_department(name: str) -> str | None:
+    """
+    Maps a department or capital city name, in any case or accentuation and
+    with or without a "Departamento de" prefix, to its canonical department.
+    """
+    normalized = normalize_text(name)
+    if normalized in DEPARTMENT_ALIASES:
+        return DEPARTMENT_ALIASES[normalized]
+
+    stripped = _DEPARTMENT_AFFIXES.sub("", normalized).strip(" ,")
+    return DEPARTMENT_ALIASES.get(stripped)
+
+
+# Cities, towns and landmarks covered by the travel guide, with their department.
+CITIES = {
+    "La Paz": "La Paz",
+    "El Alto": "La Paz",
+    "Tiwanaku": "La Paz",
+    "Copacabana": "La Paz",
+    "Isla del Sol": "La Paz",
+    "Coroico": "La Paz",
+    "Chulumani": "La Paz",
+    "Sorata": "La Paz",
+    "Guanay": "La Paz",
+    "Huayna Potosí": "La Paz",
+    "Pelechuco": "La Paz",
+    "San Buenaventura": "La Paz",
+    "Oruro": "Oruro",
+    "Sajama": "Oruro",
+    "Uyuni": "Potosí",
+    "Salar de Uyuni": "Potosí",
+    "Tupiza": "Potosí",
+    "Potosí": "Potosí",
+    "Torotoro": "Potosí",
+    "Cochabamba": "Cochabamba",
+    "Tunari": "Cochabamba",
+    "Incallajta": "Cochabamba",
+    "Villa Tunari": "Cochabamba",
+    "Aiquile": "Cochabamba",
+    "Sucre": "Chuquisaca",
+    "Tarabuco": "Chuquisaca",
+    "Tarija": "Tarija",
+    "San Lorenzo": "Tarija",
+    "Villamontes": "Tarija",
+    "Santa Cruz": "Santa Cruz",
+    "Buena Vista": "Santa Cruz",
+    "Amboró": "Santa Cruz",
+    "Samaipata": "Santa Cruz",
+    "Vallegrande": "Santa Cruz",
+    "La Higuera": "Santa Cruz",
+    "San José de Chiquitos": "Santa Cruz",
+    "Quijarro": "Santa Cruz",
+    "Noel Kempff Mercado": "Santa Cruz",
+    "Rurrenabaque": "Beni",
+    "San Ignacio de Moxos": "Beni",
+    "Trinidad": "Beni",
+    "Riberalta": "Beni",
+    "Guayaramerín": "Beni",
+    "Cobija": "Pando",
+}
+
+CITY_ALIASES = {normalize_text(city): city for city in CITIES}
+
+# Travel guide chapters (from the "NN-chapter-bol7.indd" page footers) and the
+# departments they cover.
+CHAPTER_DEPARTMENTS = {
+    "11-la-paz": ["La Paz"],
+    "12-lake-titicaca": ["La Paz"],
+    "13-the-cordilleras": ["La Paz"],
+    "14-southern-altiplano": ["Oruro", "Potosí"],
+    "15-central-highlands": ["Cochabamba", "Chuquisaca", "Potosí"],
+    "16-south-central-bol": ["Tarija"],
+    "17-santa-cruz-granchiq": ["Santa Cruz"],
+    "18-amazon-basin": ["Beni", "Pando"],
+}
+
+_LOCATION_NAMES = sorted(
+    {*CITY_ALIASES, *DEPARTMENT_ALIASES}, key=lambda name: len(name), reverse=True
+)
+_LOCATION_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in _LOCATION_NAMES) + r")\b"
+)
+
+
+def find_locations(text: str) -> list[str]:
+    """
+    Returns the normalized city and department names mentioned in `text`,
+    preferring the longest match ("salar de uyuni" over "uyuni").
+    """
+    return list(dict.fromkeys(_LOCATION_PATTERN.findall(normalize_text(text))))
+
+
+def location_key(name: str) -> str:
+    return normalize_text(name)
+
+
+def city_department(name: str) -> str | None:
+    """
+    Returns the department of a city or the department itself when `name`
+    already is one.
+    """
+    city = CITY_ALIASES.get(normalize_text(name))
+    if city is not None:
+        return CITIES[city]
+    return resolve_department(name)
@@ -0,0 +1,185 @@
+import logging
+import threading
+from functools import cache
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import PrivateAttr
+from llama_index.core.llms import LLM, ChatMessage, MessageRole
+from llama_index.core.memory.types import BaseMemory
+from llama_index.core.utils import get_tokenizer
+from ai_assistant.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below between a traveler and a Bolivia travel assistant in at most "
+    "{max_words} words. Keep the cities, dates, reservations, preferences and open questions; "
+    "drop greetings and general travel information.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:"
+)
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+
+def count_tokens(text: str, tokenizer: Callable[[str], list] | None = None) -> int:
+    return len((tokenizer or get_tokenizer())(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, tokenizer: Callable[[str], list] | None = None) -> str:
+    """
+    Keeps the first `max_tokens` tokens of `text`, cutting at a word boundary.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    if len(tokenizer(text)) <= max_tokens:
+        return text
+    # Binary search over word prefixes, tokenizers are not reversible in general.
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(tokenizer(" ".join(words[:middle]))) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " […]"
+
+
+def message_tokens(message: ChatMessage, tokenizer: Callable[[str], list] | None = None) -> int:
+    return count_tokens(str(message.content or ""), tokenizer)
+
+
+@cache
+def get_summary_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+
+class RollingSummaryMemory(BaseMemory):
+    """
+    Chat memory with a hard token budget. The most recent messages that fit in
+    `token_limit` (minus the summary) are returned verbatim and older ones are
+    folded into a rolling summary by `llm` on a background thread, so the
+    summarization never delays a turn. Until a summary covering them is ready,
+    messages outside the budget are left out of the prompt.
+    """
+
+    token_limit: int = 3000
+    summary_token_limit: int = 300
+
+    _llm: LLM | None = PrivateAttr(default=None)
+    _executor: ThreadPoolExecutor | None = PrivateAttr(default=None)
+    _messages: list[ChatMessage] = PrivateAttr(default_factory=list)
+    _summary: str = PrivateAttr(default="")
+    _summarizing: bool = PrivateAttr(default=False)
+    _generation: int = PrivateAttr(default=0)
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+
+    def __init__(
+        self,
+        llm: LLM,
+        token_limit: int = 3000,
+        summary_token_limit: int = 300,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        super().__init__(token_limit=token_limit, summary_token_limit=summary_token_limit)
+        self._llm = llm
+        self._executor = executor or get_summary_executor()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RollingSummaryMemory"
+
+    @classmethod
+    def from_defaults(cls, llm: LLM | None = None, **kwargs: Any) -> "RollingSummaryMemory":
+        if llm is None:
+            raise ValueError("RollingSummaryMemory needs an llm to summarize with")
+        return cls(llm=llm, **kwargs)
+
+    def _summary_message(self) -> list[ChatMessage]:
+        if not self._summary:
+            return []
+        return [ChatMessage(role=MessageRole.SYSTEM, content=SUMMARY_HEADER + self._summary)]
+
+    def _split(self) -> int:
+        """
+        Returns how many of the oldest messages do not fit in the budget.
+        """
+        budget = self.token_limit - count_tokens(self._summary)
+        used = 0
+        for index in range(len(self._messages) - 1, -1, -1):
+            used += message_tokens(self._messages[index])
+            if used > budget:
+                return index + 1
+        return 0
+
+    def _maybe_summarize(self):
+        with self._lock:
+            overflow = self._split()
+            if overflow == 0 or self._summarizing:
+                return
+            self._summarizing = True
+            messages, summary = self._messages[:overflow], self._summary
+            generation = self._generation
+        self._executor.submit(self._summarize, messages, summary, generation)
+
+    def _summarize(self, messages: list[ChatMessage], summary: str, generation: int):
+        transcript = "\n".join(f"{message.role.value}: {message.content}" for message in messages)
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.summary_token_limit * 0.75),
+            summary=summary or "(none)",
+            messages=transcript,
+        )
+        try:
+            with timed("memory_summary"):
+                new_summary = self._llm.complete(prompt).text.strip()
+            new_summary = truncate_tokens(new_summary, self.summary_token_limit)
+        except Exception as e:
+            # The messages are already out of the prompt, keep the previous summary.
+            logger.warning("could not summarize conversation", extra={"error": str(e)})
+            new_summary = summary
+
+        with self._lock:
+            self._summarizing = False
+            # Unless the memory was replaced or reset while summarizing, messages
+            # were only appended in between and the folded ones are still first.
+            if generation == self._generation:
+                self._summary = new_summary
+                del self._messages[: len(messages)]
+        self._maybe_summarize()
+
+    def get(self, input: str | None = None, **kwargs: Any) -> list[ChatMessage]:
+        with self._lock:
+            overflow = self._split()
+            return self._summary_message() + self._messages[overflow:]
+
+    def get_all(self) -> list[ChatMessage]:
+        with self._lock:
+            return self._summary_message() + list(self._messages)
+
+    def put(self, message: ChatMessage) -> None:
+        with self._lock:
+            self._messages.append(message)
+        self._maybe_summarize()
+
+    def set(self, messages: list[ChatMessage]) -> None:
+        with self._lock:
+            current = self._summary_message() + self._messages
+            if messages[: len(current)] == current:
+                # The agent stores `get_all()` plus the new messages after every
+                # turn: keep the summary and any summary in progress.
+                self._messages.extend(messages[len(current) :])
+            else:
+                messages = list(messages)
+                summary = ""
+                if messages and messages[0].role == MessageRole.SYSTEM and str(
+                    messages[0].content or ""
+                ).startswith(SUMMARY_HEADER):
+                    summary = str(messages.pop(0).content)[len(SUMMARY_HEADER) :]
+                self._messages = messages
+                self._summary = summary
+                self._generation += 1
+        self._maybe_summarize()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._messages = []
+            self._summary = ""
+            self._generation += 1
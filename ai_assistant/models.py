@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from enum import Enum
+from typing import Annotated, Literal
 from datetime import date, datetime
 
 class TripType(str, Enum):
@@ -34,3 +35,69 @@ class AgentAPIResponse(BaseModel):
     status: str
     agent_response: str
     timestamp: datetime = Field(default_factory=datetime.now)
+
+class FlightRequest(BaseModel):
+    kind: Literal["flight"]
+    date_str: str = Field(..., description="Flight date in 'YYYY-MM-DD' format")
+    departure: str = Field(..., description="Departure city")
+    destination: str = Field(..., description="Destination city")
+
+class BusRequest(BaseModel):
+    kind: Literal["bus"]
+    date_str: str = Field(..., description="Travel date in 'YYYY-MM-DD' format")
+    departure: str = Field(..., description="Departure city")
+    destination: str = Field(..., description="Destination city")
+
+class HotelRequest(BaseModel):
+    kind: Literal["hotel"]
+    checkin_date_str: str = Field(..., description="Check-in date in 'YYYY-MM-DD' format")
+    checkout_date_str: str = Field(..., description="Check-out date in 'YYYY-MM-DD' format")
+    hotel_name: str = Field(..., description="Name of the hotel")
+    city: str = Field(..., description="City where the hotel is located")
+
+class RestaurantRequest(BaseModel):
+    kind: Literal["restaurant"]
+    reservation_datetime_str: str = Field(
+        ..., description="Reservation date and time in 'YYYY-MM-DDTHH:MM:SS' format"
+    )
+    restaurant: str = Field(..., description="Name of the restaurant")
+    city: str = Field(..., description="City where the restaurant is located")
+    dish: str = Field("not specified", description="Specific dish to reserve")
+
+ReservationRequest = Annotated[
+    FlightRequest | BusRequest | HotelRequest | RestaurantRequest, Field(discriminator="kind")
+]
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str
+    reservation: TripReservation | HotelReservation | RestaurantReservation | None = None
+    error: str | None = None
+
+class BatchReservationResult(BaseModel):
+    status: str
+    results: list[BatchItemResult]
+
+class ReservationPage(BaseModel):
+    reservations: list[TripReservation | HotelReservation | RestaurantReservation]
+    next_cursor: str | None = None
+
+class ActivityGroup(BaseModel):
+    type: str = Field(..., description="Kind of activity, e.g. cultural, sports, nature, nightlife")
+    activities: list[str] = Field(default_factory=list)
+
+class GuideDigest(BaseModel):
+    places: list[str] = Field(default_factory=list, description="Top sights and landmarks")
+    hotels: list[str] = Field(default_factory=list, description="Hotels as 'Name: short description'")
+    restaurants: list[str] = Field(
+        default_factory=list, description="Restaurants as 'Name: cuisine or specialty'"
+    )
+    activities: list[ActivityGroup] = Field(default_factory=list, description="Activities grouped by type")
+    best_season: str | None = Field(None, description="Best time of the year to visit")
+    suggested_stay: str | None = Field(None, description="How long to stay")
+
+class LocationDigest(GuideDigest):
+    name: str
+    kind: Literal["city", "department"]
+    department: str
+    source_node_ids: list[str] = Field(default_factory=list)
@@ -0,0 +1,268 @@
+import re
+import json
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import cache, partial
+from typing import Any, Sequence
+from llama_index.core.agent import ReActAgentWorker
+from llama_index.core.agent.react.types import (
+    BaseReasoningStep,
+    ObservationReasoningStep,
+)
+from llama_index.core.agent.types import Task
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.llms import ChatResponse
+from llama_index.core.tools import BaseTool, ToolOutput
+from llama_index.core.utils import print_text
+
+_ACTION_PATTERN = re.compile(r"Action: ([^\n\(\) ]+)[^\n]*\n+Action Input:[^\{\n]*")
+_decoder = json.JSONDecoder()
+
+
+def parse_actions(text: str) -> list[tuple[str, dict]]:
+    """
+    Returns every (tool name, input) pair of a ReAct step, in order. Pairs
+    whose input is not a JSON object are skipped.
+    """
+    actions = []
+    for match in _ACTION_PATTERN.finditer(text):
+        start = text.find("{", match.end())
+        if start == -1:
+            continue
+        try:
+            action_input, _ = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(action_input, dict):
+            actions.append((match.group(1), action_input))
+    return actions
+
+
+class ParallelActionReasoningStep(BaseReasoningStep):
+    """
+    A Thought followed by several independent Action/Action Input pairs.
+    """
+
+    thought: str
+    actions: list[tuple[str, dict]]
+
+    def get_content(self) -> str:
+        lines = [f"Thought: {self.thought}"]
+        for action, action_input in self.actions:
+            lines.append(f"Action: {action}")
+            lines.append(f"Action Input: {json.dumps(action_input, ensure_ascii=False)}")
+        return "\n".join(lines)
+
+    @property
+    def is_done(self) -> bool:
+        return False
+
+
+class ParallelReActAgentWorker(ReActAgentWorker):
+    """
+    ReAct worker that runs every action of a reasoning step at once. Tools run
+    in a shared thread pool with a timeout per tool and their observations are
+    fed back to the LLM in a single step, so a turn combining several tools
+    takes as long as the slowest one.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        executor: ThreadPoolExecutor,
+        tool_timeouts: dict[str, float] | None = None,
+        default_tool_timeout: float = 30.0,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self._executor = executor
+        self._tool_timeouts = tool_timeouts or {}
+        self._default_tool_timeout = default_tool_timeout
+
+    def tool_timeout(self, tool_name: str) -> float:
+        return self._tool_timeouts.get(tool_name, self._default_tool_timeout)
+
+    def _plan(
+        self, output: ChatResponse, is_streaming: bool
+    ) -> tuple[list[BaseReasoningStep], bool, list[tuple[str, dict]]]:
+        _, current_reasoning, is_done = self._extract_reasoning_step(output, is_streaming)
+        if is_done:
+            return current_reasoning, True, []
+
+        first = current_reasoning[-1]
+        actions = [(first.action, first.action_input)]
+        extra_actions = parse_actions(output.message.content or "")
+        if extra_actions and extra_actions[0][0] == first.action:
+            extra_actions = extra_actions[1:]
+        actions.extend(extra_actions)
+        if len(actions) > 1:
+            current_reasoning[-1] = ParallelActionReasoningStep(thought=first.thought, actions=actions)
+        return current_reasoning, False, actions
+
+    @staticmethod
+    def _call_tool(tool: BaseTool, action_input: dict) -> ToolOutput:
+        try:
+            return tool.call(**action_input)
+        except Exception as e:
+            return ToolOutput(
+                content=f"Error: {e!s}",
+                tool_name=tool.metadata.get_name(),
+                raw_input={"kwargs": action_input},
+                raw_output=e,
+                is_error=True,
+            )
+
+    def _timeout_output(self, tool: BaseTool, action_input: dict) -> ToolOutput:
+        tool_name = tool.metadata.get_name()
+        message = f"Error: {tool_name} did not answer within {self.tool_timeout(tool_name):g} seconds"
+        return ToolOutput(
+            content=message,
+            tool_name=tool_name,
+            raw_input={"kwargs": action_input},
+            raw_output=TimeoutError(message),
+            is_error=True,
+        )
+
+    def _start_events(
+        self, tools_dict: dict[str, BaseTool], actions: list[tuple[str, dict]]
+    ) -> list[str | None]:
+        return [
+            self.callback_manager.on_event_start(
+                CBEventType.FUNCTION_CALL,
+                payload={
+                    EventPayload.FUNCTION_CALL: action_input,
+                    EventPayload.TOOL: tools_dict[action].metadata,
+                },
+            )
+            if action in tools_dict
+            else None
+            for action, action_input in actions
+        ]
+
+    def _observe(
+        self,
+        task: Task,
+        tools_dict: dict[str, BaseTool],
+        actions: list[tuple[str, dict]],
+        outputs: list[ToolOutput],
+        event_ids: list[str | None],
+        current_reasoning: list[BaseReasoningStep],
+    ) -> tuple[list[BaseReasoningStep], bool]:
+        for output, event_id in zip(outputs, event_ids):
+            if event_id is not None:
+                self.callback_manager.on_event_end(
+                    CBEventType.FUNCTION_CALL,
+                    payload={EventPayload.FUNCTION_OUTPUT: str(output)},
+                    event_id=event_id,
+                )
+            task.extra_state["sources"].append(output)
+
+        if len(outputs) == 1:
+            observation = str(outputs[0])
+        else:
+            observation = "\n\n".join(
+                f"[{action}] {output}" for (action, _), output in zip(actions, outputs)
+            )
+
+        return_direct = (
+            len(actions) == 1
+            and actions[0][0] in tools_dict
+            and tools_dict[actions[0][0]].metadata.return_direct
+            and not outputs[0].is_error
+        )
+        observation_step = ObservationReasoningStep(observation=observation, return_direct=return_direct)
+        current_reasoning.append(observation_step)
+        if self._verbose:
+            print_text(f"{observation_step.get_content()}\n", color="blue")
+        return current_reasoning, return_direct
+
+    def _process_actions(
+        self,
+        task: Task,
+        tools: Sequence[BaseTool],
+        output: ChatResponse,
+        is_streaming: bool = False,
+    ) -> tuple[list[BaseReasoningStep], bool]:
+        try:
+            current_reasoning, is_done, actions = self._plan(output, is_streaming)
+        except ValueError:
+            return super()._process_actions(task, tools, output, is_streaming)
+        if is_done:
+            return current_reasoning, True
+
+        tools_dict = {tool.metadata.get_name(): tool for tool in tools}
+        event_ids = self._start_events(tools_dict, actions)
+        started = time.monotonic()
+        # Tools run with the caller's context so their events count towards its request.
+        futures = [
+            self._executor.submit(
+                contextvars.copy_context().run, self._call_tool, tools_dict[action], action_input
+            )
+            if action in tools_dict
+            else None
+            for action, action_input in actions
+        ]
+
+        outputs = []
+        for (action, action_input), future in zip(actions, futures):
+            if future is None:
+                outputs.append(self._nonexistent_tool_output(action, action_input))
+                continue
+            remaining = started + self.tool_timeout(action) - time.monotonic()
+            try:
+                outputs.append(future.result(timeout=max(remaining, 0)))
+            except FutureTimeoutError:
+                outputs.append(self._timeout_output(tools_dict[action], action_input))
+
+        return self._observe(task, tools_dict, actions, outputs, event_ids, current_reasoning)
+
+    async def _aprocess_actions(
+        self,
+        task: Task,
+        tools: Sequence[BaseTool],
+        output: ChatResponse,
+        is_streaming: bool = False,
+    ) -> tuple[list[BaseReasoningStep], bool]:
+        try:
+            current_reasoning, is_done, actions = self._plan(output, is_streaming)
+        except ValueError:
+            return await super()._aprocess_actions(task, tools, output, is_streaming)
+        if is_done:
+            return current_reasoning, True
+
+        tools_dict = {tool.metadata.get_name(): tool for tool in tools}
+        event_ids = self._start_events(tools_dict, actions)
+        loop = asyncio.get_running_loop()
+
+        async def run(action: str, action_input: dict) -> ToolOutput:
+            if action not in tools_dict:
+                return self._nonexistent_tool_output(action, action_input)
+            tool = tools_dict[action]
+            call = loop.run_in_executor(
+                self._executor,
+                partial(contextvars.copy_context().run, self._call_tool, tool, action_input),
+            )
+            try:
+                return await asyncio.wait_for(call, timeout=self.tool_timeout(action))
+            except asyncio.TimeoutError:
+                return self._timeout_output(tool, action_input)
+
+        outputs = await asyncio.gather(*(run(action, action_input) for action, action_input in actions))
+        return self._observe(task, tools_dict, actions, list(outputs), event_ids, current_reasoning)
+
+    @staticmethod
+    def _nonexistent_tool_output(action: str, action_input: dict) -> ToolOutput:
+        return ToolOutput(
+            content=f"Error: No such tool named `{action}`.",
+            tool_name=action,
+            raw_input={"kwargs": action_input},
+            raw_output=None,
+            is_error=True,
+        )
+
+
+@cache
+def get_tool_executor(max_workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from functools import cache
+from typing import AsyncIterator
+from llama_index.core import PromptTemplate
+from llama_index.core.llms import LLM
+from llama_index.core.schema import MetadataMode, QueryBundle
+from ai_assistant.rags import LazyQueryEngine, get_llm, get_travel_guide_query_engine
+from ai_assistant.prompts import travel_guide_qa_tpl
+from ai_assistant.locations import city_department
+from ai_assistant.departments import get_department_summary
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationPipeline:
+    """
+    Deterministic alternative to the ReAct agent for requests about one city:
+    the travel guide retrieval and the department lookup run concurrently and
+    their results are answered with a single LLM call using the travel guide
+    QA prompt.
+    """
+
+    def __init__(self, query_engine: LazyQueryEngine, llm: LLM, qa_prompt_tpl: PromptTemplate):
+        self.query_engine = query_engine
+        self.llm = llm
+        self.qa_prompt_tpl = qa_prompt_tpl
+
+    async def retrieve(self, prompt: str) -> list[str]:
+        engine = await self.query_engine.aget_engine()
+        nodes = await engine.aretrieve(QueryBundle(prompt))
+        return [node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes]
+
+    async def department_info(self, city: str | None) -> str | None:
+        department = city_department(city) if city else None
+        if department is None:
+            return None
+        try:
+            summary = await asyncio.to_thread(get_department_summary, department)
+        except Exception as e:
+            logger.warning(
+                "could not get department info", extra={"department": department, "error": str(e)}
+            )
+            return None
+        return f"Departamento de {department} (Wikipedia):\n{summary}"
+
+    async def build_prompt(self, prompt: str, city: str | None) -> str:
+        chunks, department = await asyncio.gather(self.retrieve(prompt), self.department_info(city))
+        if department is not None:
+            chunks.append(department)
+        return self.qa_prompt_tpl.format(context_str="\n\n".join(chunks), query_str=prompt)
+
+    async def arun(self, prompt: str, city: str | None = None) -> str:
+        response = await self.llm.acomplete(await self.build_prompt(prompt, city))
+        return response.text
+
+    async def astream(self, prompt: str, city: str | None = None) -> AsyncIterator[str]:
+        response = await self.llm.astream_complete(await self.build_prompt(prompt, city))
+        async for chunk in response:
+            if chunk.delta:
+                yield chunk.delta
+
+
+@cache
+def get_recommendation_pipeline() -> RecommendationPipeline:
+    return RecommendationPipeline(
+        LazyQueryEngine(get_travel_guide_query_engine), get_llm(), travel_guide_qa_tpl
+    )
@@ -0,0 +1,115 @@
+import re
+from typing import Callable
+from pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+# Running header at the top of a page, e.g.
+# "lonelyplanet.comCENTRAL HIGHLANDSCENTRAL HIGHLANDS  ••  Sucre   213", or the
+# whole text of a header-only page, e.g. "lonelyplanet.comLA PAZ62   LA P AZ".
+_PAGE_HEADER = re.compile(
+    r"\A(?:[^\n•]{0,60}\n)?[^\n•]{0,160}?••\s+[^\n•]*?(?:\s{2,}\d{1,3}\b|(?=\n)|\Z)"
+    r"|\Alonelyplanet\.com[A-Z&' ]+(?:\n[A-Z&' ]+)?\d{1,3}\s{2,}[A-Z&' ]+(?=\n|\Z)"
+)
+# Print footers, e.g. "15-central-highlands-bol7.indd   213 8/12/09   09:23:21". The
+# page number stops before the chapter prefix of a glued footer, as in
+# "21-health-bol7.indd   35621-health-bol7.indd   356".
+_PAGE_FOOTER = re.compile(
+    r"\d\d-[a-z-]+-bol\d*\.indd\s+(?:Sec\d+:)?(?:\d{1,3}?(?=\d\d-[a-z])|\d+)"
+    r"|\d{1,2}/\d{1,2}/\d{2}\s+\d\d:\d\d:\d\d|©\s*Lonely Planet"
+)
+_SITE_LINKS = re.compile(r"Book your stay at lonelyplanet\.com/hotels|(?<![\w./])lonelyplanet\.com(?![\w/])")
+_SPACES = re.compile(r"[ \t]{2,}")
+_WORD = re.compile(r"\w+")
+
+
+def strip_boilerplate(text: str) -> str:
+    text = _PAGE_HEADER.sub("", text, count=1)
+    text = _PAGE_FOOTER.sub("", text)
+    text = _SITE_LINKS.sub("", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def shingles(text: str, size: int = 3) -> set[tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    return {tuple(words[i : i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextPackingPostprocessor(BaseNodePostprocessor):
+    """
+    Packs the retrieved guide chunks into the synthesizer prompt: strips page
+    headers and footers, drops chunks that are near-duplicates of a better
+    scored one and keeps the best chunks that fit in `token_budget` tokens,
+    truncating the last one when it does not fit whole.
+    """
+
+    token_budget: int = Field(default=1500, description="Maximum context tokens.")
+    duplicate_threshold: float = Field(
+        default=0.8, description="Word trigram Jaccard similarity above which chunks are duplicates."
+    )
+
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(self, tokenizer: Callable | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPackingPostprocessor"
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.count_tokens(text)
+        while tokens > max_tokens and text:
+            text = text[: int(len(text) * max_tokens / tokens)]
+            text = text.rsplit(None, 1)[0] if text.strip() else ""
+            tokens = self.count_tokens(text)
+        return text
+
+    def _postprocess_nodes(
+        self,
+        nodes: list[NodeWithScore],
+        query_bundle: QueryBundle | None = None,
+    ) -> list[NodeWithScore]:
+        packed: list[NodeWithScore] = []
+        kept_shingles: list[set] = []
+        used_tokens = 0
+
+        for result in sorted(nodes, key=lambda result: result.score or 0.0, reverse=True):
+            text = strip_boilerplate(result.node.get_content(metadata_mode=MetadataMode.NONE))
+            if not text:
+                continue
+
+            text_shingles = shingles(text)
+            if any(jaccard(text_shingles, kept) >= self.duplicate_threshold for kept in kept_shingles):
+                continue
+
+            remaining = self.token_budget - used_tokens
+            if remaining <= 0:
+                break
+            tokens = self.count_tokens(text)
+            if tokens > remaining:
+                text = self._truncate(text, remaining)
+                if not text:
+                    break
+                tokens = self.count_tokens(text)
+
+            node = result.node.model_copy()
+            node.set_content(text)
+            packed.append(NodeWithScore(node=node, score=result.score))
+            kept_shingles.append(text_shingles)
+            used_tokens += tokens
+            if used_tokens >= self.token_budget:
+                break
+
+        return packed
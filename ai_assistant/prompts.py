@@ -30,11 +30,14 @@ travel_guide_qa_str = """
     When responding, use ALL the tools available to you to gather the most detailed and comprehensive information possible. 
     You have access to the following tools:
     - `travel_guide_tool`: Provides general travel recommendations for cities and places in Bolivia.
+    - `get_location_digest`: Precomputed places, hotels, restaurants, activities by type and best season of a city or department, from the travel guide.
     - `flight_tool` and `bus_tool`: For reserving flights or buses between cities.
     - `hotel_tool`: To reserve hotels.
     - `restaurant_tool`: For restaurant reservations.
+    - `reserve_batch`: To make several flight, bus, hotel and restaurant reservations in a single action, e.g. every leg of a trip.
     - `department_info_tool`: For detailed information about Bolivian departments from Wikipedia. Use this tool every time a department is mentioned.
     - `trip_summary_tool`: For detailed information about the trip summary.
+    - `find_reservations`: To look up specific saved reservations by city, date range or type, e.g. what is booked in La Paz next week.
 
     Your travel advice should be returned with the following format:
 
@@ -83,7 +86,8 @@ agent_prompt_str = """
     ```
 
     When responding, combine the information from different tools. For example:
-    - Use `travel_guide_tool` for general information and context about the city.
+    - Use `get_location_digest` first for the places, hotels, restaurants and activities of a city; it answers instantly.
+    - Use `travel_guide_tool` for general information and context about the city, and for anything `get_location_digest` does not cover.
     - Use `department_info_tool` to gather detailed information about Bolivian departments whenever a department is mentioned.
     - Use `hotel_tool` and `restaurant_tool` for specific accommodation and dining recommendations, ensuring they are relevant to the mentioned city/department only.
     - Use `flight_tool` and `bus_tool` if transportation details are needed.
@@ -127,5 +131,30 @@ agent_prompt_str = """
     Below is the current conversation consisting of interleaving human and assistant messages.
 """
 
+parallel_actions_str = """
+    ## Parallel Actions
+
+    When you need several tools that do not depend on each other's output (for example `travel_guide` and
+    `get_department_info` for the same city), request them all in the same step, one Action/Action Input pair
+    after another below a single Thought. They run at the same time and you receive all their Observations together.
+
+"""
+
+location_digest_str = """
+    You are writing a reference card about {location}, Bolivia, from excerpts of an English travel guide.
+    Using ONLY the excerpts below, extract the top places to visit, the hotels, the restaurants, the activities
+    grouped by type (cultural, sports, nature, nightlife, tours...), the best season to visit and the suggested
+    length of stay in {location}.
+
+    Keep proper names as written in the guide and write every description in Spanish. Leave a field empty when
+    the excerpts do not mention it and never include places, hotels or restaurants of other cities.
+
+    Excerpts:
+    ---------------------
+    {context_str}
+    ---------------------
+"""
+
 travel_guide_qa_tpl = PromptTemplate(travel_guide_qa_str)
 agent_prompt_tpl = PromptTemplate(agent_prompt_str)
+location_digest_tpl = PromptTemplate(location_digest_str)
@@ -1,23 +1,140 @@
 import os
+import asyncio
+import threading
+from functools import cache
+from typing import Callable
 from llama_index.core import (
-    VectorStoreIndex,
     StorageContext,
     load_index_from_storage,
-    SimpleDirectoryReader,
     PromptTemplate,
     Settings,
 )
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.response.schema import RESPONSE_TYPE
+from llama_index.core.callbacks import CallbackManager
 from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import QueryBundle
 from llama_index.llms.openai import OpenAI
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from ai_assistant.config import get_agent_settings
+from ai_assistant.prompts import travel_guide_qa_tpl
+from ai_assistant.callbacks import MetricsCallbackHandler
+from ai_assistant.llm_gateway import GatewayOpenAI, LLMGateway, get_http_clients
+from ai_assistant.postprocessors import ContextPackingPostprocessor
+from ai_assistant.embeddings import CachedBatchingEmbedding, load_onnx_embedding
+from ai_assistant.vector_store import MmapVectorStore
+from ai_assistant.retrieval import HybridRetriever, RemoteRetriever, load_retrieval_indexes
+from ai_assistant.digests import get_location_digests
+from ai_assistant.store_versions import resolve_store_dir, store_exists
+from ai_assistant.docstore import (
+    load_sqlite_docstore,
+    sqlite_docstore_path,
+)
 
 SETTINGS = get_agent_settings()
 
-llm = OpenAI(model="gpt-4o-mini",api_key=SETTINGS.openai_api_key)
-embed_model = HuggingFaceEmbedding(model_name=SETTINGS.hf_embeddings_model)
-Settings.embed_model = embed_model
-Settings.llm = llm
+
+@cache
+def get_callback_manager() -> CallbackManager:
+    callback_manager = CallbackManager([MetricsCallbackHandler()])
+    Settings.callback_manager = callback_manager
+    return callback_manager
+
+
+@cache
+def get_llm_gateway() -> LLMGateway:
+    return LLMGateway(
+        max_concurrency=SETTINGS.llm_max_concurrency,
+        model_concurrency=SETTINGS.llm_model_concurrency,
+        max_waiting=SETTINGS.llm_max_queue,
+        queue_timeout=SETTINGS.llm_queue_timeout,
+        max_retries=SETTINGS.llm_max_retries,
+        retry_base_delay=SETTINGS.llm_retry_base_delay,
+        retry_max_delay=SETTINGS.llm_retry_max_delay,
+    )
+
+
+def build_llm(model: str, **kwargs) -> OpenAI:
+    """
+    OpenAI LLM going through the process-wide gateway and connection pools.
+    """
+    http_client, async_http_client = get_http_clients(
+        SETTINGS.llm_http_max_connections, SETTINGS.llm_http_max_keepalive, SETTINGS.llm_timeout
+    )
+    return GatewayOpenAI(
+        get_llm_gateway(),
+        model=model,
+        api_key=SETTINGS.openai_api_key,
+        api_base=SETTINGS.openai_api_base,
+        timeout=SETTINGS.llm_timeout,
+        # The gateway retries, honoring the rate limit headers.
+        max_retries=0,
+        http_client=http_client,
+        async_http_client=async_http_client,
+        callback_manager=get_callback_manager(),
+        **kwargs,
+    )
+
+
+@cache
+def get_llm() -> OpenAI:
+    llm = build_llm("gpt-4o-mini")
+    Settings.llm = llm
+    return llm
+
+
+@cache
+def get_summary_llm() -> OpenAI:
+    # Conversation summaries run off the critical path on a small, cheap model.
+    return build_llm(
+        SETTINGS.memory_summary_model,
+        max_tokens=SETTINGS.agent_memory_summary_tokens,
+        temperature=0,
+    )
+
+
+def load_base_embedding() -> BaseEmbedding:
+    if SETTINGS.embedding_backend == "onnx":
+        return load_onnx_embedding(
+            SETTINGS.hf_embeddings_model, SETTINGS.embedding_onnx_path, int8=SETTINGS.embedding_onnx_int8
+        )
+    # Imported here so that importing this module does not load torch.
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    return HuggingFaceEmbedding(model_name=SETTINGS.hf_embeddings_model)
+
+
+@cache
+def get_embed_model() -> BaseEmbedding:
+    embed_model = CachedBatchingEmbedding(
+        load_base_embedding(),
+        cache_size=SETTINGS.embedding_cache_size,
+        batch_window=SETTINGS.embedding_batch_window_ms / 1000,
+        max_batch_size=SETTINGS.embedding_max_batch_size,
+    )
+    embed_model.callback_manager = get_callback_manager()
+    Settings.embed_model = embed_model
+    return embed_model
+
+
+def load_storage_context(store_path: str) -> StorageContext:
+    store_path = resolve_store_dir(store_path)
+    vector_store = None
+    if MmapVectorStore.exists(store_path):
+        vector_store = MmapVectorStore(
+            store_dir=store_path,
+            code_mode=SETTINGS.vector_index_mode,
+            rescore_factor=SETTINGS.vector_rescore_factor,
+        )
+
+    docstore = None
+    if os.path.exists(sqlite_docstore_path(store_path)):
+        docstore = load_sqlite_docstore(store_path)
+
+    return StorageContext.from_defaults(
+        persist_dir=store_path, vector_store=vector_store, docstore=docstore
+    )
 
 
 class TravelGuideRAG:
@@ -29,27 +146,143 @@ class TravelGuideRAG:
     ):
         self.store_path = store_path
 
-        if not os.path.exists(store_path) and data_dir is not None:
-            self.index = self.ingest_data(store_path, data_dir)
-        else:
-            self.index = load_index_from_storage(
-                StorageContext.from_defaults(persist_dir=store_path)
-            )
+        if not store_exists(store_path) and data_dir is not None:
+            self.ingest_data(store_path, data_dir)
+        # Pinned to the version live now, later ingests publish new ones.
+        self.store_dir = resolve_store_dir(store_path)
+        self.index = load_index_from_storage(load_storage_context(self.store_dir))
 
         self.qa_prompt_tpl = qa_prompt_tpl
 
-    def ingest_data(self, store_path: str, data_dir: str) -> VectorStoreIndex:
-        documents = SimpleDirectoryReader(data_dir).load_data()
-        index = VectorStoreIndex.from_documents(documents, show_progress=True)
-        index.storage_context.persist(persist_dir=store_path)
-        return index
+    def ingest_data(self, store_path: str, data_dir: str):
+        from ai_assistant.ingest import IngestionPipeline
 
-    def get_query_engine(self) -> RetrieverQueryEngine:
-        query_engine = self.index.as_query_engine()
+        IngestionPipeline(
+            store_path,
+            data_dir,
+            workers=SETTINGS.ingest_workers,
+            embed_batch_size=SETTINGS.ingest_embed_batch_size,
+            digests=SETTINGS.location_digests,
+        ).run()
 
-        if self.qa_prompt_tpl is not None:
-            query_engine.update_prompts(
-                {"response_synthesizer:text_qa_template": self.qa_prompt_tpl}
+    def get_retriever(self) -> BaseRetriever:
+        if SETTINGS.retrieval_mode == "hybrid":
+            bm25, locations = load_retrieval_indexes(self.index, self.store_dir)
+            return HybridRetriever(
+                self.index,
+                bm25,
+                locations,
+                top_k=SETTINGS.retrieval_top_k,
+                candidate_k=SETTINGS.retrieval_candidate_k,
+                dense_weight=SETTINGS.retrieval_dense_weight,
+                callback_manager=get_callback_manager(),
             )
+        return self.index.as_retriever(
+            similarity_top_k=SETTINGS.retrieval_top_k, callback_manager=get_callback_manager()
+        )
+
+    def get_query_engine(self) -> RetrieverQueryEngine:
+        return build_query_engine(self.get_retriever(), self.qa_prompt_tpl)
+
+
+def build_query_engine(
+    retriever: BaseRetriever, qa_prompt_tpl: PromptTemplate | None = None
+) -> RetrieverQueryEngine:
+    packer = ContextPackingPostprocessor(
+        token_budget=SETTINGS.context_token_budget,
+        duplicate_threshold=SETTINGS.context_duplicate_threshold,
+    )
+    query_engine = RetrieverQueryEngine.from_args(
+        retriever, node_postprocessors=[packer], callback_manager=get_callback_manager()
+    )
+    if qa_prompt_tpl is not None:
+        query_engine.update_prompts({"response_synthesizer:text_qa_template": qa_prompt_tpl})
+    return query_engine
+
+
+@cache
+def get_travel_guide_rag() -> TravelGuideRAG:
+    get_llm()
+    get_embed_model()
+    return TravelGuideRAG(
+        store_path=SETTINGS.travel_guide_store_path,
+        data_dir=SETTINGS.travel_guide_data_path,
+        qa_prompt_tpl=travel_guide_qa_tpl,
+    )
+
+
+@cache
+def get_remote_retriever() -> RemoteRetriever:
+    return RemoteRetriever(
+        SETTINGS.retrieval_service_url,
+        timeout=SETTINGS.retrieval_service_timeout,
+        max_connections=SETTINGS.retrieval_service_max_connections,
+        callback_manager=get_callback_manager(),
+    )
+
+
+@cache
+def get_travel_guide_query_engine() -> RetrieverQueryEngine:
+    if SETTINGS.retrieval_service_url:
+        # The retrieval service owns the embedding model and the index.
+        get_llm()
+        return build_query_engine(get_remote_retriever(), travel_guide_qa_tpl)
+    return get_travel_guide_rag().get_query_engine()
+
+
+def embed_query(query: str) -> list[float]:
+    if SETTINGS.retrieval_service_url:
+        return get_remote_retriever().embed_query(query)
+    return get_embed_model().get_query_embedding(query)
+
+
+class LazyQueryEngine(BaseQueryEngine):
+    """
+    Query engine placeholder that builds the real engine on its first query, so
+    tools can be created without loading the embedding model or the index.
+    """
+
+    def __init__(self, factory: Callable[[], BaseQueryEngine]):
+        super().__init__(callback_manager=None)
+        self._factory = factory
+        self._engine: BaseQueryEngine | None = None
+        self._lock = threading.Lock()
+
+    def get_engine(self) -> BaseQueryEngine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._factory()
+        return self._engine
+
+    async def aget_engine(self) -> BaseQueryEngine:
+        # Building the engine loads the index, keep that off the event loop.
+        return self._engine or await asyncio.to_thread(self.get_engine)
+
+    def _get_prompt_modules(self) -> dict:
+        return {}
+
+    def _query(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        return self.get_engine().query(query_bundle)
+
+    async def _aquery(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        engine = await self.aget_engine()
+        return await engine.aquery(query_bundle)
+
+
+def warm_up():
+    """
+    Builds the LLM, the embedding model and the travel guide query engine and
+    loads the location digests. With a retrieval service only the client side
+    is built.
+    """
+    get_llm()
+    if not SETTINGS.retrieval_service_url:
+        get_embed_model()
+    get_travel_guide_query_engine()
+    if SETTINGS.location_digests:
+        get_location_digests()
+
 
-        return query_engine
+async def awarm_up():
+    await asyncio.to_thread(warm_up)
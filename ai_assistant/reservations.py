@@ -0,0 +1,377 @@
+import os
+import json
+import fcntl
+import logging
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from abc import ABC, abstractmethod
+from functools import cache
+from contextlib import contextmanager
+from ai_assistant.config import get_agent_settings
+from ai_assistant.text import normalize_text
+
+SETTINGS = get_agent_settings()
+
+logger = logging.getLogger(__name__)
+
+
+def load_json_log(path: str) -> list[dict]:
+    """
+    Reads a legacy trip.json reservation list, returns an empty list when the
+    file is missing or unreadable.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return []
+    try:
+        with open(path, "r") as file:
+            reservations = json.load(file)
+    except json.JSONDecodeError:
+        logger.warning("could not parse legacy trip log, skipping import", extra={"path": path})
+        return []
+    return reservations if isinstance(reservations, list) else []
+
+
+# Per reservation type: the field holding its (start) date and its city.
+RESERVATION_KEY_FIELDS = {
+    "TripReservation": ("date", "destination"),
+    "HotelReservation": ("checkin_date", "city"),
+    "RestaurantReservation": ("reservation_time", "city"),
+}
+RESERVATION_KINDS = ("flight", "bus", "hotel", "restaurant")
+
+
+def reservation_keys(res: dict) -> tuple[str, str, str]:
+    """
+    Returns the day, normalized city and kind ("flight", "bus", "hotel" or
+    "restaurant") a reservation is indexed by.
+    """
+    res_type = res.get("reservation_type", "")
+    day_field, city_field = RESERVATION_KEY_FIELDS.get(res_type, ("", ""))
+    # Dates are stored in ISO 8601, the day is always the first ten characters.
+    day = str(res.get(day_field) or "")[:10]
+    city = normalize_text(str(res.get(city_field) or ""))
+    if res_type == "TripReservation":
+        kind = str(res.get("trip_type", "")).lower()
+    else:
+        kind = res_type.removesuffix("Reservation").lower()
+    return day, city, kind
+
+
+def encode_cursor(day: str, position: int) -> str:
+    return f"{day}:{position}"
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    day, _, position = cursor.rpartition(":")
+    try:
+        return day, int(position)
+    except ValueError:
+        raise ValueError(f"invalid cursor {cursor!r}") from None
+
+
+class ReservationStore(ABC):
+    """
+    Append-only reservation log. Records are plain JSON dicts as produced by
+    `model_dump(mode="json")`, cursors are opaque increasing integers.
+    """
+
+    @abstractmethod
+    def append(self, reservations: list[dict]) -> None:
+        """Atomically appends all reservations, or none of them."""
+
+    @abstractmethod
+    def read_since(self, cursor: int = 0) -> tuple[list[dict], int]:
+        """Returns the reservations written after `cursor` and the new cursor."""
+
+    @abstractmethod
+    def import_json_log(self, path: str) -> int:
+        """One-time import of a legacy trip.json, returns the imported count."""
+
+    @abstractmethod
+    def query(
+        self,
+        city: str | None = None,
+        start: str | None = None,
+        end: str | None = None,
+        kind: str | None = None,
+        cursor: str | None = None,
+        limit: int = 20,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Returns up to `limit` reservations ordered by day whose city, kind and
+        day (between the ISO dates `start` and `end`, inclusive) match, and the
+        cursor of the next page or None when there are no more.
+        """
+
+    def all(self) -> list[dict]:
+        reservations, _ = self.read_since(0)
+        return reservations
+
+
+class SQLiteReservationStore(ReservationStore):
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        # so concurrent writers in other processes wait on the database lock.
+        self._conn = sqlite3.connect(
+            db_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS reservations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reservation_type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                day TEXT NOT NULL DEFAULT '',
+                city TEXT NOT NULL DEFAULT '',
+                kind TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._add_key_columns()
+        self._conn.executescript(
+            """
+            CREATE INDEX IF NOT EXISTS reservations_day ON reservations (day);
+            CREATE INDEX IF NOT EXISTS reservations_city_day ON reservations (city, day);
+            CREATE INDEX IF NOT EXISTS reservations_kind_day ON reservations (kind, day);
+            """
+        )
+
+    def _add_key_columns(self):
+        """
+        Adds and backfills the day, city and kind columns of databases created
+        before they existed.
+        """
+        with self._transaction() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(reservations)")}
+            if "kind" in columns:
+                return
+            for column in ("day", "city", "kind"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE reservations ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+            rows = conn.execute("SELECT id, data FROM reservations").fetchall()
+            conn.executemany(
+                "UPDATE reservations SET day = ?, city = ?, kind = ? WHERE id = ?",
+                [(*reservation_keys(json.loads(data)), row_id) for row_id, data in rows],
+            )
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _insert(self, conn: sqlite3.Connection, reservations: list[dict]):
+        conn.executemany(
+            "INSERT INTO reservations (reservation_type, data, day, city, kind) VALUES (?, ?, ?, ?, ?)",
+            [
+                (res.get("reservation_type", ""), json.dumps(res), *reservation_keys(res))
+                for res in reservations
+            ],
+        )
+
+    def append(self, reservations: list[dict]) -> None:
+        with self._transaction() as conn:
+            self._insert(conn, reservations)
+
+    def read_since(self, cursor: int = 0) -> tuple[list[dict], int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data FROM reservations WHERE id > ? ORDER BY id", (cursor,)
+            ).fetchall()
+        if not rows:
+            return [], cursor
+        return [json.loads(data) for _, data in rows], rows[-1][0]
+
+    def import_json_log(self, path: str) -> int:
+        marker = f"imported:{os.path.abspath(path)}"
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+            reservations = load_json_log(path)
+            self._insert(conn, reservations)
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, "1"))
+        return len(reservations)
+
+    def query(
+        self,
+        city: str | None = None,
+        start: str | None = None,
+        end: str | None = None,
+        kind: str | None = None,
+        cursor: str | None = None,
+        limit: int = 20,
+    ) -> tuple[list[dict], str | None]:
+        clauses, params = [], []
+        if city:
+            clauses.append("city = ?")
+            params.append(normalize_text(city))
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if start:
+            clauses.append("day >= ?")
+            params.append(start)
+        if end:
+            clauses.append("day <= ?")
+            params.append(end)
+        if cursor:
+            clauses.append("(day, id) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, day, data FROM reservations {where} ORDER BY day, id LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1][1], page[-1][0]) if len(rows) > limit else None
+        return [json.loads(data) for _, _, data in page], next_cursor
+
+
+class JsonlReservationStore(ReservationStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # In-memory indexes advanced from the file offset: sorted (day, position)
+        # keys for all reservations and per city and kind.
+        self._index_lock = threading.Lock()
+        self._index_cursor = 0
+        self._records: list[dict] = []
+        self._keys: list[tuple[str, int]] = []
+        self._city_keys: dict[str, list[tuple[str, int]]] = {}
+        self._kind_keys: dict[str, list[tuple[str, int]]] = {}
+
+    @contextmanager
+    def _file_lock(self):
+        # flock on a separate lock file serializes writers across processes.
+        with self._lock, open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def append(self, reservations: list[dict]) -> None:
+        payload = "".join(json.dumps(res) + "\n" for res in reservations)
+        with self._file_lock():
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Terminate a line left incomplete by a crash so it cannot
+                # swallow the records written now.
+                size = os.fstat(fd).st_size
+                if size > 0 and os.pread(fd, 1, size - 1) != b"\n":
+                    payload = "\n" + payload
+                os.write(fd, payload.encode())
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def read_since(self, cursor: int = 0) -> tuple[list[dict], int]:
+        if not os.path.exists(self.path):
+            return [], cursor
+
+        with open(self.path, "rb") as file:
+            file.seek(cursor)
+            data = file.read()
+
+        # Only consume complete lines, a partial trailing line is still being written.
+        end = data.rfind(b"\n") + 1
+        reservations = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                reservations.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("skipping corrupted reservation line", extra={"path": self.path})
+        return reservations, cursor + end
+
+    def import_json_log(self, path: str) -> int:
+        with self._file_lock():
+            if os.path.exists(self.path):
+                return 0
+            reservations = load_json_log(path)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as file:
+                file.writelines(json.dumps(res) + "\n" for res in reservations)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        return len(reservations)
+
+    def _refresh_index(self):
+        reservations, self._index_cursor = self.read_since(self._index_cursor)
+        for res in reservations:
+            day, city, kind = reservation_keys(res)
+            key = (day, len(self._records))
+            self._records.append(res)
+            insort(self._keys, key)
+            insort(self._city_keys.setdefault(city, []), key)
+            insort(self._kind_keys.setdefault(kind, []), key)
+
+    def query(
+        self,
+        city: str | None = None,
+        start: str | None = None,
+        end: str | None = None,
+        kind: str | None = None,
+        cursor: str | None = None,
+        limit: int = 20,
+    ) -> tuple[list[dict], str | None]:
+        city = normalize_text(city) if city else None
+        with self._index_lock:
+            self._refresh_index()
+            if city:
+                keys = self._city_keys.get(city, [])
+            elif kind:
+                keys = self._kind_keys.get(kind, [])
+            else:
+                keys = self._keys
+
+            position = bisect_left(keys, (start, -1)) if start else 0
+            if cursor:
+                position = max(position, bisect_right(keys, decode_cursor(cursor)))
+
+            page: list[tuple[str, int]] = []
+            for key in (keys[i] for i in range(position, len(keys))):
+                if end and key[0] > end:
+                    break
+                res = self._records[key[1]]
+                if city and kind and reservation_keys(res)[2] != kind:
+                    continue
+                page.append(key)
+                if len(page) > limit:
+                    break
+            next_cursor = encode_cursor(*page[limit - 1]) if len(page) > limit else None
+            return [self._records[index] for _, index in page[:limit]], next_cursor
+
+
+RESERVATION_BACKENDS = {
+    "sqlite": (SQLiteReservationStore, "trip.db"),
+    "jsonl": (JsonlReservationStore, "trip.jsonl"),
+}
+
+
+@cache
+def get_reservation_store() -> ReservationStore:
+    store_cls, default_path = RESERVATION_BACKENDS[SETTINGS.reservation_backend]
+    store = store_cls(SETTINGS.reservation_store_path or default_path)
+    imported = store.import_json_log(SETTINGS.log_file)
+    if imported:
+        logger.info("imported legacy reservations", extra={"count": imported, "path": SETTINGS.log_file})
+    return store
@@ -0,0 +1,448 @@
+import os
+import re
+import json
+import math
+import logging
+import tempfile
+import httpx
+from collections import Counter
+from typing import Iterable
+from llama_index.core import VectorStoreIndex
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+from ai_assistant.locations import (
+    CHAPTER_DEPARTMENTS,
+    CITIES,
+    CITY_ALIASES,
+    DEPARTMENT_ALIASES,
+    find_locations,
+)
+from ai_assistant.text import normalize_text
+
+BM25_FNAME = "bm25_index.json"
+LOCATIONS_FNAME = "location_index.json"
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    # English
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "with", "you", "your",
+    # Spanish
+    "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "para",
+    "por", "que", "se", "su", "un", "una", "y",
+}
+
+# The guide is in English while users and the agent usually ask in Spanish.
+# Query terms are expanded with the guide's section vocabulary.
+QUERY_TERMS = {
+    "hotel": ["hotel", "sleeping", "hostal"],
+    "hoteles": ["hotel", "sleeping", "hostal"],
+    "alojarse": ["sleeping", "hotel"],
+    "alojamiento": ["sleeping", "hotel"],
+    "hospedaje": ["sleeping", "hotel"],
+    "restaurante": ["eating", "restaurant"],
+    "restaurantes": ["eating", "restaurant"],
+    "comer": ["eating", "restaurant"],
+    "comida": ["food", "eating"],
+    "lugares": ["sights"],
+    "visitar": ["sights"],
+    "actividades": ["activities", "tours"],
+    "tours": ["tours"],
+    "excursiones": ["tours", "trek"],
+    "museo": ["museum", "museo"],
+    "museos": ["museum", "museo"],
+    "bares": ["drinking", "bar"],
+    "compras": ["shopping"],
+}
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_CHAPTER_PATTERN = re.compile(r"(\d\d-[a-z-]+?)-bol\d*\.indd")
+_HEADER_PATTERN = re.compile(
+    r"([^\n•]*?)\s*••\s+([^\n•]+?)(?=\s{2,}|\s+\d+\s|\s*\d+$|\s*lonelyplanet|\s*Book your stay|\n|$)"
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token
+        for token in _TOKEN_PATTERN.findall(normalize_text(text))
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def tokenize_query(query: str) -> list[str]:
+    tokens = []
+    for token in tokenize(query):
+        tokens.extend(QUERY_TERMS.get(token, [token]))
+    return list(dict.fromkeys(tokens))
+
+
+def node_text(node: BaseNode) -> str:
+    return node.get_content(metadata_mode=MetadataMode.NONE)
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the travel guide nodes. Postings map each
+    term to the positions of the nodes containing it and their term frequency.
+    """
+
+    def __init__(
+        self,
+        node_ids: list[str],
+        doc_lens: list[int],
+        postings: dict[str, list[list[int]]],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.node_ids = node_ids
+        self.doc_lens = doc_lens
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.positions = {node_id: position for position, node_id in enumerate(node_ids)}
+        self.avg_len = sum(doc_lens) / len(doc_lens) if doc_lens else 0.0
+        n = len(node_ids)
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @classmethod
+    def build(cls, texts: dict[str, str]) -> "BM25Index":
+        node_ids = list(texts)
+        doc_lens = []
+        postings: dict[str, list[list[int]]] = {}
+        for position, node_id in enumerate(node_ids):
+            tokens = tokenize(texts[node_id])
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append([position, tf])
+        return cls(node_ids, doc_lens, postings)
+
+    def search(
+        self, query: str, top_k: int, node_ids: Iterable[str] | None = None
+    ) -> list[tuple[str, float]]:
+        """
+        Returns the `top_k` best (node id, score) pairs, only scoring the nodes
+        in `node_ids` when given.
+        """
+        allowed = None
+        if node_ids is not None:
+            allowed = {self.positions[node_id] for node_id in node_ids if node_id in self.positions}
+
+        scores: dict[int, float] = {}
+        for term in tokenize_query(query):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, tf in self.postings[term]:
+                if allowed is not None and position not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[position] / self.avg_len)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.node_ids[position], score) for position, score in best]
+
+    def persist(self, store_dir: str):
+        write_json(
+            os.path.join(store_dir, BM25_FNAME),
+            {"node_ids": self.node_ids, "doc_lens": self.doc_lens, "postings": self.postings},
+        )
+
+    @classmethod
+    def load(cls, store_dir: str) -> "BM25Index":
+        with open(os.path.join(store_dir, BM25_FNAME), "r") as file:
+            return cls(**json.load(file))
+
+
+def _page_key(node: BaseNode) -> tuple[str, int, str]:
+    label = str(node.metadata.get("page_label", ""))
+    return (
+        node.metadata.get("file_name", ""),
+        int(label) if label.isdigit() else -1,
+        label,
+    )
+
+
+def _header_city(text: str) -> str | None:
+    """
+    Returns the city of a page from its running header, e.g.
+    "CENTRAL HIGHLANDS  ••  Sucre   213", looking at the section first and
+    then at the chapter title.
+    """
+    for title, section in _HEADER_PATTERN.findall(text[:400]):
+        for part in (section, title):
+            for name in find_locations(part):
+                if name in CITY_ALIASES:
+                    return CITY_ALIASES[name]
+        # The PDF extraction sometimes splits title letters ("LA P AZ").
+        compact_title = normalize_text(title).replace(" ", "")
+        for name, city in CITY_ALIASES.items():
+            if compact_title.endswith(name.replace(" ", "")):
+                return city
+    return None
+
+
+class LocationIndex:
+    """
+    Maps cities and departments to the ids of the guide nodes describing them.
+
+    Pages are walked in order: the chapter comes from the "NN-chapter-bol7.indd"
+    page footers and the city from the running headers, both carried over to
+    the following pages that lack them. Nodes on pages without a known city
+    are assigned to every department of their chapter.
+    """
+
+    def __init__(self, cities: dict[str, list[str]], departments: dict[str, list[str]]):
+        self.cities = cities
+        self.departments = departments
+
+    @classmethod
+    def build(cls, nodes: Iterable[BaseNode]) -> "LocationIndex":
+        pages: dict[tuple, list[BaseNode]] = {}
+        for node in nodes:
+            pages.setdefault(_page_key(node), []).append(node)
+
+        cities: dict[str, list[str]] = {}
+        departments: dict[str, list[str]] = {}
+        chapter = city = None
+        for key in sorted(pages):
+            text = "\n".join(node_text(node) for node in pages[key])
+
+            chapters = _CHAPTER_PATTERN.findall(text)
+            if chapters and chapters[0] != chapter:
+                chapter, city = chapters[0], None
+            chapter_departments = CHAPTER_DEPARTMENTS.get(chapter, [])
+            if not chapter_departments:
+                continue
+
+            if _HEADER_PATTERN.search(text[:400]):
+                city = _header_city(text)
+                if city is not None and CITIES[city] not in chapter_departments:
+                    city = None
+
+            page_departments = [CITIES[city]] if city is not None else chapter_departments
+            for node in pages[key]:
+                if city is not None:
+                    cities.setdefault(normalize_text(city), []).append(node.node_id)
+                for department in page_departments:
+                    departments.setdefault(department, []).append(node.node_id)
+
+        return cls(cities, departments)
+
+    def candidates(self, query: str) -> set[str] | None:
+        """
+        Returns the ids of the nodes about the cities and departments named in
+        `query`, or None when it names none of them. A city also brings in the
+        rest of its department.
+        """
+        node_ids: set[str] = set()
+        for name in find_locations(query):
+            if name in CITY_ALIASES:
+                node_ids.update(self.cities.get(name, []))
+                node_ids.update(self.departments.get(CITIES[CITY_ALIASES[name]], []))
+            else:
+                node_ids.update(self.departments.get(DEPARTMENT_ALIASES[name], []))
+        return node_ids or None
+
+    def persist(self, store_dir: str):
+        write_json(
+            os.path.join(store_dir, LOCATIONS_FNAME),
+            {"cities": self.cities, "departments": self.departments},
+        )
+
+    @classmethod
+    def load(cls, store_dir: str) -> "LocationIndex":
+        with open(os.path.join(store_dir, LOCATIONS_FNAME), "r") as file:
+            return cls(**json.load(file))
+
+
+def write_json(path: str, data: dict):
+    # A temporary file of its own, so concurrent writers never move each other's.
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def build_retrieval_indexes(
+    nodes: Iterable[BaseNode], store_dir: str | None = None
+) -> tuple[BM25Index, LocationIndex]:
+    """
+    Builds the lexical and location indexes of the nodes, persisting them in
+    `store_dir` when given.
+    """
+    nodes = list(nodes)
+    bm25 = BM25Index.build({node.node_id: node_text(node) for node in nodes})
+    locations = LocationIndex.build(nodes)
+    if store_dir is not None:
+        bm25.persist(store_dir)
+        locations.persist(store_dir)
+    return bm25, locations
+
+
+def load_retrieval_indexes(index: VectorStoreIndex, store_dir: str) -> tuple[BM25Index, LocationIndex]:
+    """
+    Loads the lexical and location indexes of a store. Stores ingested before
+    they existed get them built in memory; only ingest and
+    `python -m ai_assistant.retrieval` write them into the store.
+    """
+    if os.path.exists(os.path.join(store_dir, BM25_FNAME)) and os.path.exists(
+        os.path.join(store_dir, LOCATIONS_FNAME)
+    ):
+        return BM25Index.load(store_dir), LocationIndex.load(store_dir)
+
+    logger.info("building retrieval indexes in memory", extra={"store_dir": store_dir})
+    return build_retrieval_indexes(index.docstore.docs.values())
+
+
+def _min_max(scores: dict[str, float]) -> dict[str, float]:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {node_id: 1.0 for node_id in scores}
+    return {node_id: (score - low) / (high - low) for node_id, score in scores.items()}
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Prefilters the guide nodes by the cities and departments named in the
+    query, retrieves candidates from the vector store and the BM25 index and
+    fuses their min-max normalized scores.
+    """
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        bm25: BM25Index,
+        locations: LocationIndex,
+        top_k: int = 2,
+        candidate_k: int = 20,
+        dense_weight: float = 0.5,
+        callback_manager: CallbackManager | None = None,
+    ):
+        super().__init__(callback_manager=callback_manager)
+        self.index = index
+        self.bm25 = bm25
+        self.locations = locations
+        self.top_k = top_k
+        self.candidate_k = candidate_k
+        self.dense_weight = dense_weight
+
+    def _dense_retriever(self, node_ids: set[str] | None) -> BaseRetriever:
+        return self.index.as_retriever(
+            similarity_top_k=self.candidate_k,
+            node_ids=sorted(node_ids) if node_ids is not None else None,
+        )
+
+    def _fuse(
+        self,
+        query_bundle: QueryBundle,
+        node_ids: set[str] | None,
+        dense: list[NodeWithScore],
+    ) -> list[NodeWithScore]:
+        lexical = self.bm25.search(query_bundle.query_str, self.candidate_k, node_ids)
+
+        dense_scores = _min_max({result.node.node_id: result.score or 0.0 for result in dense})
+        lexical_scores = _min_max(dict(lexical))
+        fused = {
+            node_id: self.dense_weight * dense_scores.get(node_id, 0.0)
+            + (1 - self.dense_weight) * lexical_scores.get(node_id, 0.0)
+            for node_id in dense_scores.keys() | lexical_scores.keys()
+        }
+        best = sorted(fused, key=fused.get, reverse=True)[: self.top_k]
+
+        nodes = {result.node.node_id: result.node for result in dense}
+        missing = [node_id for node_id in best if node_id not in nodes]
+        if missing:
+            nodes.update({node.node_id: node for node in self.index.docstore.get_nodes(missing)})
+        return [NodeWithScore(node=nodes[node_id], score=fused[node_id]) for node_id in best]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        node_ids = self.locations.candidates(query_bundle.query_str)
+        dense = self._dense_retriever(node_ids).retrieve(query_bundle)
+        return self._fuse(query_bundle, node_ids, dense)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        node_ids = self.locations.candidates(query_bundle.query_str)
+        dense = await self._dense_retriever(node_ids).aretrieve(query_bundle)
+        return self._fuse(query_bundle, node_ids, dense)
+
+
+def nodes_to_json(nodes: list[NodeWithScore]) -> list[dict]:
+    return [{"node": doc_to_json(result.node), "score": result.score} for result in nodes]
+
+
+def nodes_from_json(data: list[dict]) -> list[NodeWithScore]:
+    return [NodeWithScore(node=json_to_doc(item["node"]), score=item["score"]) for item in data]
+
+
+class RemoteRetriever(BaseRetriever):
+    """
+    Retriever backed by the retrieval service (`ai_assistant.retrieval_service`)
+    so that API workers share its embedding model and index instead of loading
+    their own. `url` is either `unix:///path/to.sock` or `http://host:port`;
+    connections are pooled per process.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 30.0,
+        max_connections: int = 32,
+        callback_manager: CallbackManager | None = None,
+    ):
+        super().__init__(callback_manager=callback_manager)
+        self.url = url
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        uds = url.removeprefix("unix://") if url.startswith("unix://") else None
+        base_url = "http://retrieval" if uds else url
+        self._client = httpx.Client(
+            base_url=base_url, timeout=timeout, transport=httpx.HTTPTransport(uds=uds, limits=limits)
+        )
+        self._aclient = httpx.AsyncClient(
+            base_url=base_url, timeout=timeout, transport=httpx.AsyncHTTPTransport(uds=uds, limits=limits)
+        )
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        response = self._client.post("/retrieve", json={"query": query_bundle.query_str})
+        response.raise_for_status()
+        return nodes_from_json(response.json()["nodes"])
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        response = await self._aclient.post("/retrieve", json={"query": query_bundle.query_str})
+        response.raise_for_status()
+        return nodes_from_json(response.json()["nodes"])
+
+    def embed_query(self, query: str) -> list[float]:
+        response = self._client.post("/embed", json={"query": query})
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+
+if __name__ == "__main__":
+    import sys
+    from llama_index.core import load_index_from_storage
+    from ai_assistant.config import get_agent_settings
+    from ai_assistant.rags import load_storage_context
+    from ai_assistant.store_versions import resolve_store_dir
+
+    store_path = resolve_store_dir(
+        sys.argv[1] if len(sys.argv) > 1 else get_agent_settings().travel_guide_store_path
+    )
+    index = load_index_from_storage(load_storage_context(store_path))
+    bm25, locations = build_retrieval_indexes(index.docstore.docs.values(), store_path)
+    print(f"indexed {len(bm25.node_ids)} nodes, {len(locations.cities)} cities")
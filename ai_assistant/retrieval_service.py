@@ -0,0 +1,89 @@
+"""
+Retrieval service: owns the embedding model and the travel guide index so
+that API workers only hold a `RemoteRetriever` client. Concurrent requests
+from all workers share the embedding micro-batcher.
+
+    python -m ai_assistant.retrieval_service --uds /tmp/ai_assistant_retrieval.sock
+    RETRIEVAL_SERVICE_URL=unix:///tmp/ai_assistant_retrieval.sock fastapi run ai_assistant/api.py --workers 8
+"""
+import asyncio
+import argparse
+from functools import cache
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import QueryBundle
+from ai_assistant.rags import get_embed_model, get_travel_guide_rag
+from ai_assistant.retrieval import nodes_to_json
+from ai_assistant.config import get_agent_settings
+from ai_assistant.logs import configure_logging
+from ai_assistant.metrics import REGISTRY, observe_request
+
+SETTINGS = get_agent_settings()
+
+configure_logging(SETTINGS.log_level, SETTINGS.log_format)
+
+
+class QueryRequest(BaseModel):
+    query: str
+
+
+@cache
+def get_retriever() -> BaseRetriever:
+    return get_travel_guide_rag().get_retriever()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(get_retriever)
+    yield
+
+
+app = FastAPI(title="AI Agent retrieval", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    return await observe_request(request, call_next)
+
+
+@app.get("/health")
+def health():
+    return {"status": "OK"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/retrieve")
+async def retrieve(request: QueryRequest):
+    nodes = await get_retriever().aretrieve(QueryBundle(request.query))
+    return {"nodes": nodes_to_json(nodes)}
+
+
+@app.post("/embed")
+async def embed(request: QueryRequest):
+    return {"embedding": await get_embed_model().aget_query_embedding(request.query)}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uds", help="Unix socket to listen on")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    if args.uds:
+        uvicorn.run(app, uds=args.uds, log_level="warning")
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
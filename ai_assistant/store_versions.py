@@ -0,0 +1,86 @@
+import os
+import time
+import shutil
+import logging
+
+CURRENT_FNAME = "CURRENT"
+VERSIONS_DIR = "versions"
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_store_dir(store_path: str) -> str:
+    """
+    Returns the directory holding the live version of a store: the version
+    named by its CURRENT pointer, or `store_path` itself for stores written
+    before they were versioned.
+    """
+    pointer = os.path.join(store_path, CURRENT_FNAME)
+    if not os.path.exists(pointer):
+        return store_path
+    with open(pointer, "r") as file:
+        return os.path.join(store_path, VERSIONS_DIR, file.read().strip())
+
+
+def store_exists(store_path: str) -> bool:
+    """
+    Whether the store has a live version, versioned or not. A store holding
+    only the versions of interrupted runs has none.
+    """
+    if not os.path.isdir(store_path):
+        return False
+    return any(entry != VERSIONS_DIR for entry in os.listdir(store_path))
+
+
+def new_version_dir(store_path: str) -> str:
+    """
+    Creates an empty directory for the next version of a store.
+    """
+    versions = os.path.join(store_path, VERSIONS_DIR)
+    os.makedirs(versions, exist_ok=True)
+    name = f"v{time.time_ns()}"
+    os.makedirs(os.path.join(versions, name))
+    return os.path.join(versions, name)
+
+
+def copy_store(store_path: str, version_dir: str):
+    """
+    Copies the live version of a store into `version_dir`.
+    """
+    source = resolve_store_dir(store_path)
+    ignore = shutil.ignore_patterns(CURRENT_FNAME, VERSIONS_DIR) if source == store_path else None
+    shutil.copytree(source, version_dir, ignore=ignore, dirs_exist_ok=True)
+
+
+def publish_version(store_path: str, version_dir: str):
+    """
+    Makes `version_dir` the live version of the store by atomically replacing
+    its CURRENT pointer, then removes the files of a pre-versioning store and
+    every version but the new and the previous one. A crash at any point
+    leaves either the old or the new version live; leftovers of interrupted
+    runs are removed on the next publish.
+    """
+    name = os.path.basename(version_dir.rstrip(os.sep))
+    previous = os.path.basename(resolve_store_dir(store_path))
+    pointer = os.path.join(store_path, CURRENT_FNAME)
+    with open(pointer + ".tmp", "w") as file:
+        file.write(name)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(pointer + ".tmp", pointer)
+
+    for entry in os.listdir(store_path):
+        if entry in (CURRENT_FNAME, VERSIONS_DIR):
+            continue
+        path = os.path.join(store_path, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+    # The previous version stays for readers that resolved it just before the swap.
+    versions = os.path.join(store_path, VERSIONS_DIR)
+    for entry in os.listdir(versions):
+        if entry not in (name, previous):
+            logger.info("removing store version", extra={"version": entry})
+            shutil.rmtree(os.path.join(versions, entry), ignore_errors=True)
@@ -0,0 +1,109 @@
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from llama_index.core.agent import ReActAgent
+from llama_index.core.chat_engine.types import StreamingAgentChatResponse
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def agent_events(
+    agent: ReActAgent,
+    prompt: str,
+    request: Request,
+    include_steps: bool = False,
+    on_complete: Callable[[str], Awaitable[None]] | None = None,
+) -> AsyncIterator[str]:
+    """
+    Runs the agent step by step and yields Server-Sent Events: optional `step`
+    events with the intermediate Thought/Action/Observation, `token` events
+    with the final answer and a closing `done` event.
+
+    When the client disconnects Starlette cancels this generator, which also
+    cancels the LLM call awaited at that moment. `on_complete` receives the full
+    answer once it has been streamed completely.
+    """
+    task = agent.create_task(prompt)
+    emitted_steps = 0
+    try:
+        while True:
+            if await request.is_disconnected():
+                return
+
+            step_output = await agent.astream_step(task.task_id)
+
+            if include_steps:
+                reasoning = task.extra_state.get("current_reasoning", [])
+                for reasoning_step in reasoning[emitted_steps:]:
+                    yield sse_event(
+                        "step",
+                        {"type": type(reasoning_step).__name__, "content": reasoning_step.get_content()},
+                    )
+                emitted_steps = len(reasoning)
+
+            if step_output.is_last:
+                break
+
+        response = agent.finalize_response(task.task_id, step_output)
+        tokens = []
+        if isinstance(response, StreamingAgentChatResponse):
+            async for token in response.async_response_gen():
+                tokens.append(token)
+                yield sse_event("token", token)
+        else:
+            tokens.append(str(response))
+            yield sse_event("token", tokens[0])
+
+        if on_complete is not None:
+            await on_complete("".join(tokens))
+        yield sse_event("done", {"status": "OK"})
+    finally:
+        if task.task_id in agent.state.task_dict:
+            agent.delete_task(task.task_id)
+
+
+async def token_events(
+    tokens: AsyncIterator[str],
+    request: Request,
+    on_complete: Callable[[str], Awaitable[None]] | None = None,
+) -> AsyncIterator[str]:
+    """
+    Yields `token` events for an already generated answer stream, followed by
+    a `done` event. Stops early when the client disconnects.
+    """
+    received = []
+    async for token in tokens:
+        if await request.is_disconnected():
+            return
+        received.append(token)
+        yield sse_event("token", token)
+
+    if on_complete is not None:
+        await on_complete("".join(received))
+    yield sse_event("done", {"status": "OK"})
+
+
+async def text_events(text: str) -> AsyncIterator[str]:
+    yield sse_event("token", text)
+    yield sse_event("done", {"status": "OK"})
+
+
+def event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def agent_event_stream(
+    agent: ReActAgent,
+    prompt: str,
+    request: Request,
+    include_steps: bool = False,
+    on_complete: Callable[[str], Awaitable[None]] | None = None,
+) -> StreamingResponse:
+    return event_stream(agent_events(agent, prompt, request, include_steps, on_complete))
@@ -0,0 +1,11 @@
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """
+    Case and accent folds a string and collapses its whitespace, so that
+    "Potosí", " potosi " and "POTOSI" map to the same value.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
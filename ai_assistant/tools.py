@@ -1,32 +1,48 @@
-import json
+import logging
 from random import randint
-import wikipedia
 from datetime import date, datetime
 from llama_index.core.tools import QueryEngineTool, FunctionTool, ToolMetadata
-from ai_assistant.rags import TravelGuideRAG
-from ai_assistant.prompts import travel_guide_qa_tpl, travel_guide_description
-from ai_assistant.config import get_agent_settings
+from ai_assistant.rags import LazyQueryEngine, get_travel_guide_query_engine
+from ai_assistant.prompts import travel_guide_description
+from pydantic import TypeAdapter, ValidationError
 from ai_assistant.models import (
     TripReservation,
     TripType,
     HotelReservation,
     RestaurantReservation,
+    ReservationRequest,
+    FlightRequest,
+    BusRequest,
+    HotelRequest,
+    BatchItemResult,
+    BatchReservationResult,
+    ReservationPage,
 )
-from ai_assistant.utils import save_reservation
+from ai_assistant.utils import save_reservation, save_reservations
+from ai_assistant.trip_summary import get_trip_summary_view
+from ai_assistant.reservations import RESERVATION_KINDS, get_reservation_store
+from ai_assistant.locations import resolve_department
+from ai_assistant.departments import get_department_summary
+from ai_assistant.digests import get_location_digests, render_digest
 
-SETTINGS = get_agent_settings()
+logger = logging.getLogger(__name__)
 
 travel_guide_tool = QueryEngineTool(
-    query_engine=TravelGuideRAG(
-        store_path=SETTINGS.travel_guide_store_path,
-        data_dir=SETTINGS.travel_guide_data_path,
-        qa_prompt_tpl=travel_guide_qa_tpl,
-    ).get_query_engine(),
+    query_engine=LazyQueryEngine(get_travel_guide_query_engine),
     metadata=ToolMetadata(
         name="travel_guide", description=travel_guide_description, return_direct=False
     ),
 )
 
+def build_flight_reservation(date_str: str, departure: str, destination: str) -> TripReservation:
+    return TripReservation(
+        trip_type=TripType.flight,
+        departure=departure,
+        destination=destination,
+        date=date.fromisoformat(date_str),
+        cost=randint(200, 700),
+    )
+
 def reserve_flight(date_str: str, departure: str, destination: str) -> TripReservation:
     """
     Reserves a flight from a departure city to a destination city on a specific date.
@@ -39,20 +55,25 @@ def reserve_flight(date_str: str, departure: str, destination: str) -> TripReser
     Returns:
         TripReservation: Flight reservation object with reservation details.
     """
-    print(f"Making flight reservation from {departure} to {destination} on date: {date_str}")
-    reservation = TripReservation(
-        trip_type=TripType.flight,
-        departure=departure,
-        destination=destination,
-        date=date.fromisoformat(date_str),
-        cost=randint(200, 700),
+    logger.debug(
+        "making flight reservation",
+        extra={"departure": departure, "destination": destination, "date": date_str},
     )
-
+    reservation = build_flight_reservation(date_str, departure, destination)
     save_reservation(reservation)
     return reservation
 
 flight_tool = FunctionTool.from_defaults(fn=reserve_flight, return_direct=False)
 
+def build_bus_reservation(date_str: str, departure: str, destination: str) -> TripReservation:
+    return TripReservation(
+        trip_type=TripType.bus,
+        departure=departure,
+        destination=destination,
+        date=date.fromisoformat(date_str),
+        cost=randint(50, 200),
+    )
+
 def reserve_bus(date_str: str, departure: str, destination: str) -> TripReservation:
     """
     Reserves a bus ticket from a departure city to a destination city on a specific date.
@@ -65,20 +86,33 @@ def reserve_bus(date_str: str, departure: str, destination: str) -> TripReservat
     Returns:
         TripReservation: Bus reservation object with reservation details.
     """
-    print(f"Making bus reservation from {departure} to {destination} on date: {date_str}")
-    reservation = TripReservation(
-        trip_type=TripType.bus,
-        departure=departure,
-        destination=destination,
-        date=date.fromisoformat(date_str),
-        cost=randint(50, 200),
+    logger.debug(
+        "making bus reservation",
+        extra={"departure": departure, "destination": destination, "date": date_str},
     )
-
+    reservation = build_bus_reservation(date_str, departure, destination)
     save_reservation(reservation)
     return reservation
 
 bus_tool = FunctionTool.from_defaults(fn=reserve_bus, return_direct=False)
 
+def build_hotel_reservation(
+    checkin_date_str: str, checkout_date_str: str, hotel_name: str, city: str
+) -> HotelReservation:
+    checkin_date = date.fromisoformat(checkin_date_str)
+    checkout_date = date.fromisoformat(checkout_date_str)
+    num_nights = (checkout_date - checkin_date).days
+    cost_per_night = randint(100, 300)
+    total_cost = num_nights * cost_per_night
+
+    return HotelReservation(
+        checkin_date=checkin_date,
+        checkout_date=checkout_date,
+        hotel_name=hotel_name,
+        city=city,
+        cost=total_cost,
+    )
+
 def reserve_hotel(
     checkin_date_str: str, checkout_date_str: str, hotel_name: str, city: str
 ) -> HotelReservation:
@@ -94,26 +128,32 @@ def reserve_hotel(
     Returns:
         HotelReservation: Hotel reservation object with reservation details.
     """
-    print(f"Making hotel reservation at {hotel_name} in {city} from {checkin_date_str} to {checkout_date_str}")
-    checkin_date = date.fromisoformat(checkin_date_str)
-    checkout_date = date.fromisoformat(checkout_date_str)
-    num_nights = (checkout_date - checkin_date).days
-    cost_per_night = randint(100, 300)
-    total_cost = num_nights * cost_per_night
-
-    reservation = HotelReservation(
-        checkin_date=checkin_date,
-        checkout_date=checkout_date,
-        hotel_name=hotel_name,
-        city=city,
-        cost=total_cost,
+    logger.debug(
+        "making hotel reservation",
+        extra={
+            "hotel": hotel_name,
+            "city": city,
+            "checkin": checkin_date_str,
+            "checkout": checkout_date_str,
+        },
     )
-
+    reservation = build_hotel_reservation(checkin_date_str, checkout_date_str, hotel_name, city)
     save_reservation(reservation)
     return reservation
 
 hotel_tool = FunctionTool.from_defaults(fn=reserve_hotel, return_direct=False)
 
+def build_restaurant_reservation(
+    reservation_datetime_str: str, restaurant: str, city: str, dish: str = "not specified"
+) -> RestaurantReservation:
+    return RestaurantReservation(
+        reservation_time=datetime.fromisoformat(reservation_datetime_str),
+        restaurant=restaurant,
+        city=city,
+        dish=dish,
+        cost=randint(20, 100),
+    )
+
 def reserve_restaurant(
     reservation_datetime_str: str, restaurant: str, city: str, dish: str = "not specified"
 ) -> RestaurantReservation:
@@ -129,86 +169,135 @@ def reserve_restaurant(
     Returns:
         RestaurantReservation: Restaurant reservation object with reservation details.
     """
-    print(f"Making restaurant reservation at {restaurant} in {city} on {reservation_datetime_str}")
-    reservation_time = datetime.fromisoformat(reservation_datetime_str)
-    cost = randint(20, 100)
-
-    reservation = RestaurantReservation(
-        reservation_time=reservation_time,
-        restaurant=restaurant,
-        city=city,
-        dish=dish,
-        cost=cost,
+    logger.debug(
+        "making restaurant reservation",
+        extra={"restaurant": restaurant, "city": city, "datetime": reservation_datetime_str},
     )
-
+    reservation = build_restaurant_reservation(reservation_datetime_str, restaurant, city, dish)
     save_reservation(reservation)
     return reservation
 
 restaurant_tool = FunctionTool.from_defaults(fn=reserve_restaurant, return_direct=False)
 
+RESERVATION_REQUEST_ADAPTER = TypeAdapter(ReservationRequest)
+
+def build_reservation(
+    request: ReservationRequest,
+) -> TripReservation | HotelReservation | RestaurantReservation:
+    if isinstance(request, FlightRequest):
+        return build_flight_reservation(request.date_str, request.departure, request.destination)
+    if isinstance(request, BusRequest):
+        return build_bus_reservation(request.date_str, request.departure, request.destination)
+    if isinstance(request, HotelRequest):
+        return build_hotel_reservation(
+            request.checkin_date_str, request.checkout_date_str, request.hotel_name, request.city
+        )
+    return build_restaurant_reservation(
+        request.reservation_datetime_str, request.restaurant, request.city, request.dish
+    )
+
+def reserve_batch(reservations: list[ReservationRequest]) -> BatchReservationResult:
+    """
+    Reserves several flights, bus tickets, hotels and restaurants at once, for example
+    every leg of a trip. Either all reservations are made or none of them.
+
+    Args:
+        reservations (list): Reservations to make. Each one has a "kind" ("flight", "bus",
+            "hotel" or "restaurant") and the same arguments as the single reservation tool
+            of that kind.
+
+    Returns:
+        BatchReservationResult: "OK" with every reservation made, or "error" with the
+            reason each invalid item was rejected; nothing is saved in that case.
+    """
+    results = []
+    built = []
+    for index, item in enumerate(reservations):
+        try:
+            request = RESERVATION_REQUEST_ADAPTER.validate_python(item)
+            reservation = build_reservation(request)
+        except (ValidationError, ValueError) as e:
+            results.append(BatchItemResult(index=index, status="error", error=str(e)))
+            continue
+        results.append(BatchItemResult(index=index, status="OK", reservation=reservation))
+        built.append(reservation)
+
+    logger.debug(
+        "making batch reservation",
+        extra={"count": len(results), "valid": len(built)},
+    )
+    if len(built) < len(results):
+        return BatchReservationResult(status="error", results=results)
+
+    save_reservations(built)
+    return BatchReservationResult(status="OK", results=results)
+
+batch_tool = FunctionTool.from_defaults(fn=reserve_batch, return_direct=False)
+
 def generate_trip_summary() -> str:
     """
-    Generates a detailed summary of the trip based on the reservations in trip.json.
+    Generates a detailed summary of the trip based on the saved reservations.
 
     Returns:
         str: A detailed trip report including activities organized by place and date,
              a summary of the total budget, and comments on the places and activities.
     """
-    try:
-        with open(SETTINGS.log_file, "r") as file:
-            reservations = json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return "No travel reservations found. Please make some reservations first."
-
-    total_cost = 0
-    summary = {}
-
-    for res in reservations:
-        res_type = res.get("reservation_type")
-        if res_type == "TripReservation":
-            date_str = res["date"]
-            date_obj = datetime.fromisoformat(date_str)
-            city = res["destination"]
-            activity = f"Travel by {res['trip_type']} from {res['departure']} to {res['destination']} on {date_str}"
-        elif res_type == "HotelReservation":
-            date_str = res["checkin_date"]
-            date_obj = datetime.fromisoformat(date_str)
-            city = res["city"]
-            activity = f"Stay at {res['hotel_name']} from {res['checkin_date']} to {res['checkout_date']}"
-        elif res_type == "RestaurantReservation":
-            date_str = res["reservation_time"]
-            date_obj = datetime.fromisoformat(date_str)
-            city = res["city"]
-            activity = f"Reservation at {res['restaurant']} on {res['reservation_time']}"
-        else:
-            continue
+    return get_trip_summary_view().render()
 
-        total_cost += res.get("cost", 0)
+trip_summary_tool = FunctionTool.from_defaults(fn=generate_trip_summary, return_direct=False)
 
-        date_key = date_obj.strftime("%Y-%m-%d")
-        if date_key not in summary:
-            summary[date_key] = []
-        summary[date_key].append({
-            "city": city,
-            "activity": activity,
-            "cost": res.get("cost", 0)
-        })
 
-    report = "Trip Summary:\n"
-    for date in sorted(summary.keys()):
-        report += f"\nDate: {date}\n"
-        for item in summary[date]:
-            report += f"- City: {item['city']}\n"
-            report += f"  Activity: {item['activity']}\n"
-            report += f"  Cost: ${item['cost']}\n"
+RESERVATION_MODELS = {
+    "TripReservation": TripReservation,
+    "HotelReservation": HotelReservation,
+    "RestaurantReservation": RestaurantReservation,
+}
+MAX_RESERVATIONS_PAGE = 100
+
+def find_reservations(
+    city: str | None = None,
+    from_date: str | None = None,
+    to_date: str | None = None,
+    reservation_type: str | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+) -> ReservationPage:
+    """
+    Finds saved reservations, ordered by date, filtered by city, date range and type.
 
-    report += f"\nEstimated Total Cost: ${total_cost}\n"
+    Args:
+        city (str, optional): City of the reservation (destination for flights and buses).
+        from_date (str, optional): First date to include, in 'YYYY-MM-DD' format.
+        to_date (str, optional): Last date to include, in 'YYYY-MM-DD' format.
+        reservation_type (str, optional): One of "flight", "bus", "hotel" or "restaurant".
+        cursor (str, optional): The next_cursor of a previous result to get the following page.
+        limit (int, optional): Maximum number of reservations to return, at most 100.
 
-    report += "\nWe hope you enjoy your trip! Remember to visit local attractions and immerse yourself in the culture."
+    Returns:
+        ReservationPage: The matching reservations and the cursor of the next page, if any.
+    """
+    if reservation_type is not None and reservation_type not in RESERVATION_KINDS:
+        raise ValueError(f"reservation_type must be one of {', '.join(RESERVATION_KINDS)}")
+    # Validates the dates, the store compares them as ISO strings.
+    start = date.fromisoformat(from_date).isoformat() if from_date else None
+    end = date.fromisoformat(to_date).isoformat() if to_date else None
 
-    return report
+    records, next_cursor = get_reservation_store().query(
+        city=city,
+        start=start,
+        end=end,
+        kind=reservation_type,
+        cursor=cursor,
+        limit=max(1, min(limit, MAX_RESERVATIONS_PAGE)),
+    )
+    reservations = [
+        RESERVATION_MODELS[res["reservation_type"]].model_validate(res)
+        for res in records
+        if res.get("reservation_type") in RESERVATION_MODELS
+    ]
+    return ReservationPage(reservations=reservations, next_cursor=next_cursor)
 
-trip_summary_tool = FunctionTool.from_defaults(fn=generate_trip_summary, return_direct=False)
+find_reservations_tool = FunctionTool.from_defaults(fn=find_reservations, return_direct=False)
 
 
 def get_department_info(department_name: str) -> str:
@@ -221,14 +310,32 @@ def get_department_info(department_name: str) -> str:
     Returns:
         str: A summary of information about the department.
     """
-    try:
-        wikipedia.set_lang("es")  # Set language to Spanish
-        page = wikipedia.page(department_name + " (departamento de Bolivia)")
-        summary = page.summary
-        return summary
-    except wikipedia.exceptions.PageError:
+    department = resolve_department(department_name)
+    if department is None:
         return f"No se encontró una página de Wikipedia para {department_name}."
+
+    try:
+        return get_department_summary(department)
     except Exception as e:
         return f"Ocurrió un error al obtener la información: {e}"
 
-department_info_tool = FunctionTool.from_defaults(fn=get_department_info, return_direct=False)
\ No newline at end of file
+department_info_tool = FunctionTool.from_defaults(fn=get_department_info, return_direct=False)
+
+
+def get_location_digest(location: str) -> str:
+    """
+    Returns the precomputed travel guide digest of a Bolivian city or department: places to
+    visit, hotels, restaurants, activities by type, best season and suggested stay.
+
+    Args:
+        location (str): Name of the city or department.
+
+    Returns:
+        str: The digest, or a note to use the travel guide when there is none.
+    """
+    digest = get_location_digests().get(location)
+    if digest is None:
+        return f"No hay un resumen precalculado para {location}, usa la herramienta travel_guide."
+    return render_digest(digest)
+
+location_digest_tool = FunctionTool.from_defaults(fn=get_location_digest, return_direct=False)
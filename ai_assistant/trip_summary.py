@@ -0,0 +1,106 @@
+import threading
+from bisect import insort
+from functools import cache
+from ai_assistant.reservations import ReservationStore, get_reservation_store
+
+TRIP_SUMMARY_CLOSING = (
+    "\nWe hope you enjoy your trip! Remember to visit local attractions and immerse yourself in the culture."
+)
+
+
+def summarize_reservation(res: dict) -> dict | None:
+    res_type = res.get("reservation_type")
+    if res_type == "TripReservation":
+        date_str = res["date"]
+        city = res["destination"]
+        activity = f"Travel by {res['trip_type']} from {res['departure']} to {res['destination']} on {date_str}"
+    elif res_type == "HotelReservation":
+        date_str = res["checkin_date"]
+        city = res["city"]
+        activity = f"Stay at {res['hotel_name']} from {res['checkin_date']} to {res['checkout_date']}"
+    elif res_type == "RestaurantReservation":
+        date_str = res["reservation_time"]
+        city = res["city"]
+        activity = f"Reservation at {res['restaurant']} on {res['reservation_time']}"
+    else:
+        return None
+
+    # Dates are stored in ISO 8601, the day is always the first ten characters.
+    return {"date": date_str[:10], "city": city, "activity": activity, "cost": res.get("cost", 0)}
+
+
+class TripSummaryView:
+    """
+    Materialized trip summary: per-date and per-city groupings and the running
+    cost total, advanced from the reservation log cursor so each refresh only
+    reads the reservations written since the previous one.
+    """
+
+    def __init__(self, store: ReservationStore):
+        self.store = store
+        self.cursor = 0
+        self.count = 0
+        self.total_cost = 0
+        self.dates: list[str] = []
+        self.by_date: dict[str, list[dict]] = {}
+        self.by_city: dict[str, list[dict]] = {}
+        self._date_blocks: dict[str, str] = {}
+        self._report: str | None = None
+        self._lock = threading.Lock()
+
+    def _add(self, res: dict):
+        item = summarize_reservation(res)
+        if item is None:
+            return
+
+        self.count += 1
+        self.total_cost += item["cost"]
+        if item["date"] not in self.by_date:
+            self.by_date[item["date"]] = []
+            insort(self.dates, item["date"])
+        self.by_date[item["date"]].append(item)
+        self.by_city.setdefault(item["city"], []).append(item)
+        self._date_blocks.pop(item["date"], None)
+        self._report = None
+
+    def refresh(self) -> int:
+        """
+        Applies the reservations saved since the last refresh and returns the
+        current version, which changes whenever the summary changes.
+        """
+        with self._lock:
+            reservations, self.cursor = self.store.read_since(self.cursor)
+            for res in reservations:
+                self._add(res)
+            return self.cursor
+
+    def _render_date(self, date_key: str) -> str:
+        if date_key not in self._date_blocks:
+            lines = [f"\nDate: {date_key}\n"]
+            for item in self.by_date[date_key]:
+                lines.append(f"- City: {item['city']}\n")
+                lines.append(f"  Activity: {item['activity']}\n")
+                lines.append(f"  Cost: ${item['cost']}\n")
+            self._date_blocks[date_key] = "".join(lines)
+        return self._date_blocks[date_key]
+
+    def render(self) -> str:
+        self.refresh()
+        with self._lock:
+            if self.count == 0:
+                return "No travel reservations found. Please make some reservations first."
+            if self._report is None:
+                self._report = "".join(
+                    [
+                        "Trip Summary:\n",
+                        *(self._render_date(date_key) for date_key in self.dates),
+                        f"\nEstimated Total Cost: ${self.total_cost}\n",
+                        TRIP_SUMMARY_CLOSING,
+                    ]
+                )
+            return self._report
+
+
+@cache
+def get_trip_summary_view() -> TripSummaryView:
+    return TripSummaryView(get_reservation_store())
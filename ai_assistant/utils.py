@@ -1,41 +1,35 @@
-import os
-import json
-from datetime import date, datetime
+import logging
 from ai_assistant.models import (
     RestaurantReservation,
     TripReservation,
     HotelReservation,
-    TripType,
 )
-from ai_assistant.config import get_agent_settings
+from ai_assistant.reservations import get_reservation_store
+from ai_assistant.trip_summary import get_trip_summary_view
+from ai_assistant.metrics import timed
 
-SETTINGS = get_agent_settings()
-
-
-def custom_serializer(obj):
-    if isinstance(obj, (date, datetime)):
-        return obj.isoformat()  # Convert date and datetime to ISO 8601 string
-    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+logger = logging.getLogger(__name__)
 
 
 def save_reservation(
     reservation: RestaurantReservation | TripReservation | HotelReservation,
 ):
-    reservation_dict = reservation.model_dump()
-    print(f"saving reservation: {reservation_dict}")
-    reservations = []
-    if os.path.exists(SETTINGS.log_file) and os.path.getsize(SETTINGS.log_file) > 0:
-        with open(SETTINGS.log_file, "r") as file:
-            try:
-                reservations = json.load(file)
-            except json.JSONDecodeError:
-                reservation = []
-    else:
-        reservations = []
-    reservation_dict["reservation_type"] = reservation.__class__.__name__
-    reservations.append(reservation_dict)
+    save_reservations([reservation])
 
-    with open(SETTINGS.log_file, "w") as file:
-        json.dump(reservations, file, indent=4, default=custom_serializer)
 
-    print(f"saved reservation!")
+def save_reservations(
+    reservations: list[RestaurantReservation | TripReservation | HotelReservation],
+):
+    """
+    Appends all reservations to the trip log in a single write, either all of
+    them are saved or none.
+    """
+    reservation_dicts = []
+    for reservation in reservations:
+        reservation_dict = reservation.model_dump(mode="json")
+        reservation_dict["reservation_type"] = reservation.__class__.__name__
+        reservation_dicts.append(reservation_dict)
+    with timed("trip_log"):
+        get_reservation_store().append(reservation_dicts)
+        get_trip_summary_view().refresh()
+    logger.debug("saved reservations", extra={"reservations": reservation_dicts})
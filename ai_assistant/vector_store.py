@@ -0,0 +1,370 @@
+import os
+import json
+import mmap
+import numpy as np
+from contextlib import contextmanager
+from typing import Any, Iterator, Sequence
+from pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+VECTORS_FNAME = "vectors.f32"
+SIDECAR_FNAME = "vectors.json"
+INT8_FNAME = "vectors.i8"
+BINARY_FNAME = "vectors.bin"
+CODE_MODES = ("float32", "int8", "binary")
+
+# Number of set bits of every byte value, for Hamming distances on packed codes.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def int8_scales(matrix: np.ndarray) -> np.ndarray:
+    """
+    Per-dimension scales mapping the largest absolute value of each column to 127.
+    """
+    scales = np.abs(matrix).max(axis=0) / 127 if matrix.size else np.ones(matrix.shape[1:])
+    scales[scales == 0] = 1.0
+    return scales.astype(np.float32)
+
+
+def encode_int8(matrix: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+
+
+def encode_binary(matrix: np.ndarray) -> np.ndarray:
+    """
+    Sign bit of every dimension, packed 8 per byte.
+    """
+    return np.packbits(matrix > 0, axis=-1)
+
+
+def _write_file(path: str, data: bytes):
+    with open(path + ".tmp", "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _write_store(
+    store_dir: str, matrix: np.ndarray, node_ids: list[str], ref_doc_ids: list[str | None]
+):
+    os.makedirs(store_dir, exist_ok=True)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    scales = int8_scales(matrix) if matrix.ndim == 2 else np.ones(0, dtype=np.float32)
+    files = {
+        VECTORS_FNAME: matrix.tobytes(),
+        INT8_FNAME: encode_int8(matrix, scales).tobytes() if matrix.size else b"",
+        BINARY_FNAME: encode_binary(matrix).tobytes() if matrix.size else b"",
+    }
+
+    # Write to temporary files first so readers never see a half written store.
+    for fname, data in files.items():
+        _write_file(os.path.join(store_dir, fname), data)
+    sidecar_path = os.path.join(store_dir, SIDECAR_FNAME)
+    with open(sidecar_path + ".tmp", "w") as file:
+        json.dump(
+            {
+                "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+                "count": len(node_ids),
+                "node_ids": node_ids,
+                "ref_doc_ids": ref_doc_ids,
+                "int8_scales": scales.tolist(),
+            },
+            file,
+        )
+    for fname in files:
+        os.replace(os.path.join(store_dir, fname) + ".tmp", os.path.join(store_dir, fname))
+    os.replace(sidecar_path + ".tmp", sidecar_path)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store that keeps L2-normalized float32 embeddings in a contiguous
+    file, opened with mmap and searched with a single matrix product.
+
+    With `code_mode` "int8" or "binary" the search runs over compact codes
+    held in memory (per-dimension scaled int8, or sign bits compared by
+    Hamming distance) and only the best `rescore_factor * top_k` candidates
+    are rescored with their float32 vectors.
+    """
+
+    stores_text: bool = False
+    store_dir: str
+    code_mode: str = "float32"
+    rescore_factor: int = 4
+
+    _node_ids: list[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: list[str | None] = PrivateAttr(default_factory=list)
+    _matrix: np.ndarray | None = PrivateAttr(default=None)
+    _mmap: mmap.mmap | None = PrivateAttr(default=None)
+    _codes: np.ndarray | None = PrivateAttr(default=None)
+    _scales: np.ndarray | None = PrivateAttr(default=None)
+    # Inside bulk_update: the stored matrix and the added vectors, and which of
+    # their rows (counted across all of them) make up the store.
+    _staged: list[np.ndarray] | None = PrivateAttr(default=None)
+    _staged_rows: list[int] = PrivateAttr(default_factory=list)
+    _staged_count: int = PrivateAttr(default=0)
+
+    def __init__(self, store_dir: str, **kwargs: Any):
+        super().__init__(store_dir=store_dir, **kwargs)
+        if self.code_mode not in CODE_MODES:
+            raise ValueError(f"code_mode must be one of {', '.join(CODE_MODES)}")
+        self._load()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @classmethod
+    def exists(cls, store_dir: str) -> bool:
+        return os.path.exists(os.path.join(store_dir, VECTORS_FNAME)) and os.path.exists(
+            os.path.join(store_dir, SIDECAR_FNAME)
+        )
+
+    @property
+    def client(self) -> None:
+        return None
+
+    def _load(self):
+        sidecar_path = os.path.join(self.store_dir, SIDECAR_FNAME)
+        if not os.path.exists(sidecar_path):
+            return
+
+        with open(sidecar_path, "r") as file:
+            sidecar = json.load(file)
+        self._node_ids = sidecar["node_ids"]
+        self._ref_doc_ids = sidecar["ref_doc_ids"]
+
+        if sidecar["count"] == 0:
+            self._matrix = np.zeros((0, sidecar["dim"]), dtype=np.float32)
+            return
+
+        # The mapping is shared between processes, so uvicorn workers reuse the
+        # same physical pages instead of each holding a private copy.
+        with open(os.path.join(self.store_dir, VECTORS_FNAME), "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._matrix = np.frombuffer(self._mmap, dtype=np.float32).reshape(
+            sidecar["count"], sidecar["dim"]
+        )
+        self._load_codes(sidecar)
+
+    def _load_codes(self, sidecar: dict):
+        self._codes = None
+        if self.code_mode == "float32":
+            return
+
+        count, dim = sidecar["count"], sidecar["dim"]
+        scales = sidecar.get("int8_scales")
+        self._scales = np.asarray(scales, dtype=np.float32) if scales else int8_scales(self._matrix)
+        fname, dtype, width = {
+            "int8": (INT8_FNAME, np.int8, dim),
+            "binary": (BINARY_FNAME, np.uint8, (dim + 7) // 8),
+        }[self.code_mode]
+        path = os.path.join(self.store_dir, fname)
+        if os.path.exists(path) and os.path.getsize(path) == count * width:
+            self._codes = np.fromfile(path, dtype=dtype).reshape(count, width)
+        elif self.code_mode == "int8":
+            # Stores written before the code files existed.
+            self._codes = encode_int8(np.asarray(self._matrix), self._scales)
+        else:
+            self._codes = encode_binary(np.asarray(self._matrix))
+
+    def _current_matrix(self) -> np.ndarray:
+        if self._staged is not None:
+            parts = [part for part in self._staged if part.size]
+            if not parts:
+                return np.zeros((0, 0), dtype=np.float32)
+            return np.vstack(parts)[self._staged_rows]
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(self._matrix)
+
+    def _rewrite(self, matrix: np.ndarray, node_ids: list[str], ref_doc_ids: list[str | None]):
+        # The new files replace the old ones by rename, so the current mapping
+        # stays valid until every view over it (e.g. a running query) is gone.
+        _write_store(self.store_dir, matrix, node_ids, ref_doc_ids)
+        old_mmap = self._mmap
+        self._matrix = None
+        self._codes = None
+        self._mmap = None
+        self._load()
+        if old_mmap is not None:
+            try:
+                old_mmap.close()
+            except BufferError:
+                # Still exported, it is unmapped once the last view is collected.
+                pass
+
+    @contextmanager
+    def bulk_update(self) -> Iterator["MmapVectorStore"]:
+        """
+        Stages the `add` and `delete` calls made inside the block and applies
+        them with a single rewrite of the store when it exits, instead of one
+        rewrite per call.
+        """
+        if self._staged is not None:
+            yield self
+            return
+
+        current = self._current_matrix()
+        saved = self._node_ids, self._ref_doc_ids, self._codes
+        self._staged = [current]
+        self._staged_rows = list(range(current.shape[0]))
+        self._staged_count = current.shape[0]
+        unchanged = self._staged_rows
+        # The codes only cover the stored rows, search the staged ones in float32.
+        self._codes = None
+        del current
+        try:
+            yield self
+            matrix = self._current_matrix() if self._staged_rows != unchanged else None
+        except BaseException:
+            self._staged = None
+            self._node_ids, self._ref_doc_ids, self._codes = saved
+            raise
+
+        self._staged = None
+        self._staged_rows = []
+        if matrix is None:
+            self._codes = saved[2]
+            return
+        self._rewrite(matrix, self._node_ids, self._ref_doc_ids)
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> list[str]:
+        if not nodes:
+            return []
+
+        new_vectors = _normalize(
+            np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        )
+        node_ids = self._node_ids + [node.node_id for node in nodes]
+        ref_doc_ids = self._ref_doc_ids + [node.ref_doc_id for node in nodes]
+        if self._staged is not None:
+            self._staged.append(new_vectors)
+            self._staged_rows = self._staged_rows + list(
+                range(self._staged_count, self._staged_count + len(nodes))
+            )
+            self._staged_count += len(nodes)
+            self._node_ids, self._ref_doc_ids = node_ids, ref_doc_ids
+            return [node.node_id for node in nodes]
+
+        current = self._current_matrix()
+        # vstack copies the rows, no view over the mapping outlives this line.
+        matrix = new_vectors if current.size == 0 else np.vstack([current, new_vectors])
+        del current
+        self._rewrite(matrix, node_ids, ref_doc_ids)
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        if ref_doc_id not in self._ref_doc_ids:
+            return
+
+        keep = [i for i, ref in enumerate(self._ref_doc_ids) if ref != ref_doc_id]
+        node_ids = [self._node_ids[i] for i in keep]
+        ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+        if self._staged is not None:
+            self._staged_rows = [self._staged_rows[i] for i in keep]
+            self._node_ids, self._ref_doc_ids = node_ids, ref_doc_ids
+            return
+
+        self._rewrite(self._current_matrix()[keep], node_ids, ref_doc_ids)
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        matrix = self._current_matrix()
+        if matrix.shape[0] == 0 or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        candidates = np.arange(matrix.shape[0])
+        if query.node_ids:
+            wanted = set(query.node_ids)
+            candidates = np.array(
+                [i for i, node_id in enumerate(self._node_ids) if node_id in wanted],
+                dtype=np.int64,
+            )
+            matrix = matrix[candidates]
+
+        top_k = min(query.similarity_top_k, candidates.shape[0])
+        if top_k == 0:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        query_vector = _normalize(np.asarray(query.query_embedding, dtype=np.float32))
+        if self._codes is not None:
+            rows = self._code_candidates(query_vector, candidates, top_k * self.rescore_factor)
+            candidates, matrix = candidates[rows], matrix[rows]
+        scores = matrix @ query_vector
+
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=[float(scores[i]) for i in top],
+            ids=[self._node_ids[candidates[i]] for i in top],
+        )
+
+    def _code_candidates(self, query_vector: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions within `candidates` of the `k` best approximate matches.
+        """
+        if k >= candidates.shape[0]:
+            return np.arange(candidates.shape[0])
+
+        codes = self._codes[candidates]
+        if self.code_mode == "int8":
+            approx = codes.astype(np.float32) @ (query_vector * self._scales)
+        else:
+            distances = _POPCOUNT[np.bitwise_xor(codes, encode_binary(query_vector))].sum(axis=1)
+            approx = -distances.astype(np.float32)
+        return np.argpartition(-approx, k - 1)[:k]
+
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        # StorageContext passes the JSON file path of the default vector store,
+        # the binary files always live next to it.
+        persist_dir = os.path.dirname(persist_path) or "."
+        if os.path.abspath(persist_dir) == os.path.abspath(self.store_dir):
+            return
+        _write_store(persist_dir, self._current_matrix(), self._node_ids, self._ref_doc_ids)
+
+
+def convert_simple_vector_store(json_path: str, store_dir: str) -> MmapVectorStore:
+    """
+    Converts a persisted SimpleVectorStore JSON file into the binary layout
+    used by MmapVectorStore.
+    """
+    with open(json_path, "r") as file:
+        data = json.load(file)
+
+    embedding_dict = data.get("embedding_dict", {})
+    node_ids = list(embedding_dict.keys())
+    text_id_to_ref_doc_id = data.get("text_id_to_ref_doc_id", {})
+    ref_doc_ids = [text_id_to_ref_doc_id.get(node_id) for node_id in node_ids]
+
+    if node_ids:
+        matrix = _normalize(
+            np.asarray([embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+        )
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+
+    _write_store(store_dir, matrix, node_ids, ref_doc_ids)
+    return MmapVectorStore(store_dir=store_dir)
+
+
+if __name__ == "__main__":
+    import sys
+    from ai_assistant.store_versions import resolve_store_dir
+
+    store_path = resolve_store_dir(sys.argv[1] if len(sys.argv) > 1 else "travel_guide_store")
+    json_path = os.path.join(store_path, "default__vector_store.json")
+    store = convert_simple_vector_store(json_path, store_path)
+    print(f"converted {len(store._node_ids)} vectors into {store_path}")
@@ -0,0 +1,234 @@
+"""
+Local stand-in for the OpenAI chat completions API. Replays scripted
+responses chosen by regex against the last message, with configurable
+latency, so the agent, the RAG and the API can be benchmarked offline. A
+fraction of the requests can be answered with 429 and a Retry-After header to
+exercise the retries of the LLM gateway.
+
+    python -m benchmarks.fake_openai --port 8089 --latency-ms 300 --token-ms 5
+    python -m benchmarks.fake_openai --rate-limit 0.2 --retry-after-ms 200
+
+Then point the app at it with OPENAI_API_BASE=http://127.0.0.1:8089/v1.
+"""
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# First matching rule wins; `match` is searched in the last message.
+DEFAULT_SCRIPT = [
+    {
+        # Travel guide synthesis and the recommendation pipeline.
+        "match": r"Context information is below",
+        "response": (
+            "Ciudad: La Paz\n"
+            "- Lugares para visitar: Mercado de las Brujas, Valle de la Luna, Plaza Murillo\n"
+            "- Duración de Estadía Sugerida: 3 días\n"
+            "- Restaurantes: Gustu (cocina boliviana contemporánea)\n"
+            "- Hoteles: Hotel Rosario, céntrico y tradicional\n"
+            "- Actividades (culturales): visita al Museo Nacional de Etnografía y Folklore"
+        ),
+    },
+    {
+        # The ReAct agent got its observations back.
+        "match": r"^\s*Observation:",
+        "response": (
+            "Thought: I can answer without using any more tools. I'll use the user's language to answer.\n"
+            "Answer: Te recomiendo visitar La Paz durante tres días: el Mercado de las Brujas, "
+            "el Valle de la Luna y una noche en el Hotel Rosario."
+        ),
+    },
+    {
+        # First ReAct step: consult the guide and the department together.
+        "match": r".",
+        "response": (
+            "Thought: The current language of the user is: Spanish. I need to gather information "
+            "from multiple tools to answer the question comprehensively.\n"
+            'Action: travel_guide\nAction Input: {"input": "Recomendaciones para La Paz"}\n'
+            'Action: get_department_info\nAction Input: {"department_name": "La Paz"}'
+        ),
+    },
+]
+
+app = FastAPI(title="Fake OpenAI")
+app.state.script = DEFAULT_SCRIPT
+app.state.latency = 0.0
+app.state.jitter = 0.0
+app.state.token_latency = 0.0
+app.state.rate_limit = 0.0
+app.state.retry_after = 0.0
+app.state.requests = 0
+app.state.rate_limited = 0
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def pick_response(messages: list[dict]) -> str:
+    last = message_text(messages[-1]) if messages else ""
+    for rule in app.state.script:
+        if re.search(rule["match"], last, re.MULTILINE):
+            return rule["response"]
+    return "Answer: OK"
+
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+async def wait_first_token():
+    delay = app.state.latency + random.uniform(0, app.state.jitter)
+    if delay:
+        await asyncio.sleep(delay)
+
+
+@app.get("/health")
+def health():
+    return {"status": "OK", "requests": app.state.requests, "rate_limited": app.state.rate_limited}
+
+
+def rate_limited() -> JSONResponse:
+    app.state.rate_limited += 1
+    return JSONResponse(
+        status_code=429,
+        content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+        headers={"retry-after-ms": str(int(app.state.retry_after * 1000))},
+    )
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.requests += 1
+    if random.random() < app.state.rate_limit:
+        return rate_limited()
+    messages = body.get("messages", [])
+    content = pick_response(messages)
+    completion_id = f"chatcmpl-{app.state.requests}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4o-mini")
+    usage = {
+        "prompt_tokens": sum(count_tokens(message_text(message)) for message in messages),
+        "completion_tokens": count_tokens(content),
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+    if not body.get("stream"):
+        await wait_first_token()
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    def chunk(delta: dict, finish_reason: str | None = None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def events():
+        await wait_first_token()
+        yield chunk({"role": "assistant", "content": ""})
+        for token in re.findall(r"\S+\s*|\s+", content):
+            if app.state.token_latency:
+                await asyncio.sleep(app.state.token_latency)
+            yield chunk({"content": token})
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def start_fake_server(
+    port: int,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    token_ms: float = 0.0,
+    script: str | None = None,
+    timeout: float = 30.0,
+    rate_limit: float = 0.0,
+    retry_after_ms: float = 0.0,
+) -> subprocess.Popen:
+    """
+    Starts the fake server in a subprocess and waits until it answers.
+    """
+    import httpx
+
+    command = [
+        sys.executable, "-m", "benchmarks.fake_openai",
+        "--port", str(port),
+        "--latency-ms", str(latency_ms),
+        "--jitter-ms", str(jitter_ms),
+        "--token-ms", str(token_ms),
+        "--rate-limit", str(rate_limit),
+        "--retry-after-ms", str(retry_after_ms),
+    ]
+    if script:
+        command += ["--script", script]
+    process = subprocess.Popen(command)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError("fake OpenAI server exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    raise TimeoutError("fake OpenAI server did not start")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before the first token")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra delay up to this value")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Delay between streamed tokens")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=float, default=0.0, help="Retry-After sent with the 429 responses")
+    parser.add_argument("--script", help='JSON file with a list of {"match": regex, "response": text} rules')
+    args = parser.parse_args()
+
+    if args.script:
+        with open(args.script, "r") as file:
+            app.state.script = json.load(file)
+    app.state.latency = args.latency_ms / 1000
+    app.state.jitter = args.jitter_ms / 1000
+    app.state.token_latency = args.token_ms / 1000
+    app.state.rate_limit = args.rate_limit
+    app.state.retry_after = args.retry_after_ms / 1000
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
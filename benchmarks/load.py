@@ -0,0 +1,139 @@
+"""
+Load test for the API: sends concurrent requests to each endpoint and reports
+throughput and p50/p95/p99 latencies. By default the app runs in-process; with
+--fake-llm the LLM calls go to the local fake OpenAI server, so no network is
+needed. Notes are varied per request so the response cache does not answer.
+
+    python -m benchmarks.load --fake-llm --latency-ms 300 --concurrency 16 --requests 200
+    python -m benchmarks.load --url http://127.0.0.1:8000 --endpoints places hotels
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import httpx
+from benchmarks.results import add_baseline_arguments, finish, summarize
+
+CITIES = ["La Paz", "Sucre", "Potosí", "Uyuni", "Cochabamba", "Santa Cruz"]
+
+
+def endpoint_request(endpoint: str, i: int) -> tuple[str, str, dict]:
+    """
+    Returns the method, path and httpx keyword arguments of the `i`-th
+    request to `endpoint`.
+    """
+    city = CITIES[i % len(CITIES)]
+    notes = [f"visita {i}"]
+    if endpoint in ("places", "hotels", "activities"):
+        return "GET", f"/recommendations/{endpoint}", {"params": {"city": city, "notes": notes}}
+    if endpoint == "cities":
+        return "GET", "/recommendations/cities", {"params": {"notes": notes}}
+    if endpoint == "trip_report":
+        return "GET", "/trip/report", {}
+    if endpoint == "reserve":
+        body = {
+            "departure": city,
+            "destination": CITIES[(i + 1) % len(CITIES)],
+            "date_str": f"2024-12-{i % 28 + 1:02d}",
+        }
+        return "POST", "/reserve/flight", {"json": body}
+    raise ValueError(f"unknown endpoint {endpoint}")
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, kwargs = endpoint_request(endpoint, i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def run(args) -> dict[str, dict]:
+    timeout = httpx.Timeout(args.timeout)
+    results = {}
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            for endpoint in args.endpoints:
+                results[f"load/{endpoint}"] = await run_endpoint(client, endpoint, args.requests, args.concurrency)
+        return results
+
+    # Imported here so the environment set up in `main` applies to the settings.
+    from ai_assistant.api import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=timeout) as client:
+            for endpoint in args.endpoints:
+                results[f"load/{endpoint}"] = await run_endpoint(client, endpoint, args.requests, args.concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="Base URL of a running server; the app runs in-process by default")
+    parser.add_argument(
+        "--endpoints",
+        nargs="*",
+        choices=["places", "hotels", "activities", "cities", "trip_report", "reserve"],
+        default=["places", "hotels", "activities", "trip_report", "reserve"],
+    )
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--fake-llm", action="store_true", help="Start the fake OpenAI server for the in-process app")
+    parser.add_argument("--fake-port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of fake LLM requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=float, default=100.0)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    fake_server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fake_llm and not args.url:
+            from benchmarks.fake_openai import start_fake_server
+
+            fake_server = start_fake_server(
+                args.fake_port,
+                args.latency_ms,
+                args.jitter_ms,
+                args.token_ms,
+                rate_limit=args.rate_limit,
+                retry_after_ms=args.retry_after_ms,
+            )
+            os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{args.fake_port}/v1"
+            os.environ.setdefault("OPENAI_API_KEY", "fake")
+            # Keep the reservations made by the benchmark out of the real trip log.
+            os.environ["RESERVATION_STORE_PATH"] = os.path.join(tmp, "trip.db")
+            os.environ["LOG_FILE"] = os.path.join(tmp, "trip.json")
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            if fake_server is not None:
+                fake_server.terminate()
+                fake_server.wait()
+
+    sys.exit(finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Micro-benchmarks for the hot paths of the assistant: query embedding,
+travel guide retrieval, `save_reservation` and `generate_trip_summary` with
+trip logs of increasing size. Reservation benchmarks run on temporary stores.
+
+    python -m benchmarks.micro --sizes 10 1000 100000 --save benchmarks/baselines/micro.json
+    python -m benchmarks.micro --only reservations --compare benchmarks/baselines/micro.json
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+from benchmarks.results import add_baseline_arguments, finish, measure
+
+QUERIES = [
+    "Recomienda lugares para visitar en {city}.",
+    "Recomienda hoteles para alojarse en {city}.",
+    "Recomienda actividades interesantes para realizar en {city}.",
+]
+CITIES = ["La Paz", "Sucre", "Potosí", "Uyuni", "Cochabamba", "Santa Cruz", "Rurrenabaque", "Tarija"]
+
+
+def sample_queries() -> list[str]:
+    return [query.format(city=city) for city in CITIES for query in QUERIES]
+
+
+def fake_reservations(count: int, seed: int = 0) -> list[dict]:
+    from ai_assistant.models import HotelReservation, RestaurantReservation, TripReservation, TripType
+
+    rng = random.Random(seed)
+    start = date(2024, 11, 1)
+    reservations = []
+    for i in range(count):
+        day = start + timedelta(days=rng.randrange(365))
+        city = rng.choice(CITIES)
+        kind = i % 3
+        if kind == 0:
+            reservation = TripReservation(
+                trip_type=rng.choice([TripType.flight, TripType.bus]),
+                date=day,
+                departure=rng.choice(CITIES),
+                destination=city,
+                cost=rng.randint(50, 700),
+            )
+        elif kind == 1:
+            reservation = HotelReservation(
+                checkin_date=day,
+                checkout_date=day + timedelta(days=rng.randint(1, 5)),
+                hotel_name=f"Hotel {i}",
+                city=city,
+                cost=rng.randint(100, 1000),
+            )
+        else:
+            reservation = RestaurantReservation(
+                reservation_time=datetime.combine(day, datetime.min.time()) + timedelta(hours=20),
+                restaurant=f"Restaurante {i}",
+                city=city,
+                dish="salteñas",
+                cost=rng.randint(10, 100),
+            )
+        data = reservation.model_dump(mode="json")
+        data["reservation_type"] = reservation.__class__.__name__
+        reservations.append(data)
+    return reservations
+
+
+def bench_embedding(repeat: int) -> dict[str, dict]:
+    from ai_assistant.rags import get_embed_model
+
+    embed_model = get_embed_model()
+    counter = iter(range(10**9))
+    queries = sample_queries()
+    texts = [f"{query} ({i})" for i, query in enumerate(queries * 2)][:32]
+    return {
+        "embedding/query_uncached": measure(
+            lambda: embed_model.get_query_embedding(f"{queries[0]} #{next(counter)}"), repeat
+        ),
+        "embedding/query_cached": measure(lambda: embed_model.get_query_embedding(queries[0]), repeat),
+        "embedding/text_batch_32": measure(lambda: embed_model.get_text_embedding_batch(texts), max(repeat // 10, 3)),
+    }
+
+
+def bench_retrieval(repeat: int) -> dict[str, dict]:
+    from ai_assistant.rags import get_travel_guide_query_engine, get_travel_guide_rag
+
+    queries = sample_queries()
+    hybrid = get_travel_guide_query_engine().retriever
+    dense = get_travel_guide_rag().index.as_retriever(similarity_top_k=hybrid.top_k)
+    # Embed every query once so the numbers exclude the embedding model.
+    for query in queries:
+        dense.retrieve(query)
+
+    def cycle(retriever):
+        position = iter(range(10**9))
+        return lambda: retriever.retrieve(queries[next(position) % len(queries)])
+
+    return {
+        "retrieval/hybrid": measure(cycle(hybrid), repeat),
+        "retrieval/dense": measure(cycle(dense), repeat),
+    }
+
+
+def bench_reservations(size: int, repeat: int, backend: str) -> dict[str, dict]:
+    from ai_assistant import reservations, trip_summary
+    from ai_assistant.config import get_agent_settings
+    from ai_assistant.models import TripReservation, TripType
+    from ai_assistant.tools import generate_trip_summary
+    from ai_assistant.utils import save_reservation
+
+    settings = get_agent_settings()
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.reservation_backend = backend
+        settings.reservation_store_path = os.path.join(tmp, f"trip.{backend}")
+        settings.log_file = os.path.join(tmp, "trip.json")
+        reservations.get_reservation_store.cache_clear()
+        trip_summary.get_trip_summary_view.cache_clear()
+
+        store = reservations.get_reservation_store()
+        log = fake_reservations(size)
+        for start in range(0, len(log), 10_000):
+            store.append(log[start : start + 10_000])
+
+        def cold_summary():
+            trip_summary.get_trip_summary_view.cache_clear()
+            return generate_trip_summary()
+
+        reservation = TripReservation(
+            trip_type=TripType.bus,
+            date=date(2024, 12, 1),
+            departure="La Paz",
+            destination="Sucre",
+            cost=120,
+        )
+        prefix = f"reservations[{backend},{size}]"
+        results = {
+            f"{prefix}/generate_trip_summary_cold": measure(cold_summary, max(repeat // 10, 3)),
+            f"{prefix}/save_reservation": measure(lambda: save_reservation(reservation), repeat),
+            f"{prefix}/generate_trip_summary": measure(generate_trip_summary, repeat),
+        }
+
+        reservations.get_reservation_store.cache_clear()
+        trip_summary.get_trip_summary_view.cache_clear()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--only",
+        nargs="*",
+        choices=["embedding", "retrieval", "reservations"],
+        default=["embedding", "retrieval", "reservations"],
+    )
+    parser.add_argument("--sizes", nargs="*", type=int, default=[10, 1_000, 100_000])
+    parser.add_argument("--backend", choices=["sqlite", "jsonl"], default="sqlite")
+    parser.add_argument("--repeat", type=int, default=50)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    if "embedding" in args.only:
+        results.update(bench_embedding(args.repeat))
+    if "retrieval" in args.only:
+        results.update(bench_retrieval(args.repeat))
+    if "reservations" in args.only:
+        for size in args.sizes:
+            results.update(bench_reservations(size, args.repeat, args.backend))
+
+    sys.exit(finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Recall@k and latency of the embedding backends and vector index modes on a
+fixed query set. The reference is the current setup: the PyTorch model and
+exact float32 search over the whole index.
+
+    python -m benchmarks.quantization --backends torch onnx-int8 --modes float32 int8 binary
+"""
+import sys
+import time
+import argparse
+from benchmarks.micro import sample_queries
+from benchmarks.results import add_baseline_arguments, finish, summarize
+
+EXTRA_QUERIES = [
+    "¿Cuál es la mejor época para visitar el Salar de Uyuni?",
+    "Excursiones desde Rurrenabaque a la selva y las pampas",
+    "Cómo llegar al lago Titicaca y la Isla del Sol desde La Paz",
+    "Museos y arquitectura colonial en Sucre",
+    "Visita a las minas del Cerro Rico en Potosí",
+    "Vida nocturna y bares en Santa Cruz",
+    "Trekking en la Cordillera Real",
+    "Mercados y comida típica en Cochabamba",
+]
+
+
+def load_backend(name: str):
+    from ai_assistant.config import get_agent_settings
+    from ai_assistant.embeddings import load_onnx_embedding
+
+    settings = get_agent_settings()
+    if name == "torch":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+        return HuggingFaceEmbedding(model_name=settings.hf_embeddings_model)
+    return load_onnx_embedding(
+        settings.hf_embeddings_model, settings.embedding_onnx_path, int8=name == "onnx-int8"
+    )
+
+
+def embed_queries(embed_model, queries: list[str]) -> tuple[list[list[float]], dict]:
+    latencies, embeddings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.append(embed_model.get_query_embedding(query))
+        latencies.append(time.perf_counter() - start)
+    return embeddings, summarize(latencies)
+
+
+def search(store, embeddings: list[list[float]], k: int) -> tuple[list[list[str]], dict]:
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+
+    latencies, results = [], []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=k))
+        latencies.append(time.perf_counter() - start)
+        results.append(result.ids)
+    return results, summarize(latencies)
+
+
+def recall(results: list[list[str]], reference: list[list[str]], k: int) -> float:
+    hits = sum(len(set(found[:k]) & set(expected[:k])) for found, expected in zip(results, reference))
+    return hits / (k * len(reference)) if reference else 0.0
+
+
+def main():
+    from ai_assistant.config import get_agent_settings
+    from ai_assistant.vector_store import MmapVectorStore
+    from ai_assistant.store_versions import resolve_store_dir
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--store", default=get_agent_settings().travel_guide_store_path)
+    parser.add_argument("--backends", nargs="*", choices=["torch", "onnx", "onnx-int8"], default=["torch", "onnx-int8"])
+    parser.add_argument("--modes", nargs="*", choices=["float32", "int8", "binary"], default=["float32", "int8", "binary"])
+    parser.add_argument("--k", nargs="*", type=int, default=[2, 10])
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    queries = sample_queries() + EXTRA_QUERIES
+    max_k = max(args.k)
+    stores = {
+        mode: MmapVectorStore(store_dir=resolve_store_dir(args.store), code_mode=mode, rescore_factor=args.rescore_factor)
+        for mode in set(args.modes) | {"float32"}
+    }
+
+    reference_embeddings, _ = embed_queries(load_backend("torch"), queries)
+    reference, _ = search(stores["float32"], reference_embeddings, max_k)
+
+    results = {}
+    for backend in args.backends:
+        embed_model = load_backend(backend)
+        embed_model.get_query_embedding(queries[0])
+        embeddings, embed_latency = embed_queries(embed_model, queries)
+        results[f"embedding[{backend}]"] = embed_latency
+        for mode in args.modes:
+            found, search_latency = search(stores[mode], embeddings, max_k)
+            for k in args.k:
+                search_latency[f"recall@{k}"] = recall(found, reference, k)
+            results[f"search[{backend},{mode}]"] = search_latency
+
+    for name, result in results.items():
+        recalls = ", ".join(f"{key}={value:.3f}" for key, value in result.items() if key.startswith("recall@"))
+        if recalls:
+            print(f"{name}: {recalls}")
+    sys.exit(finish(results, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Helpers shared by the benchmarks: latency summaries, result tables and
+baseline files for regression checks.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+from typing import Callable
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: list[float], elapsed: float | None = None, errors: int = 0) -> dict:
+    """
+    Summarizes latencies in seconds into milliseconds percentiles, plus the
+    throughput when the wall-clock `elapsed` time is given.
+    """
+    summary = {
+        "n": len(latencies),
+        "errors": errors,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+    if elapsed:
+        summary["throughput_rps"] = len(latencies) / elapsed
+    return summary
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def print_table(results: dict[str, dict]):
+    columns = ["n", "errors", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "throughput_rps"]
+    columns = [column for column in columns if any(column in result for result in results.values())]
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  " + "  ".join(f"{column:>14}" for column in columns))
+    for name, result in results.items():
+        cells = []
+        for column in columns:
+            value = result.get(column, "")
+            cells.append(f"{value:>14.2f}" if isinstance(value, float) else f"{value!s:>14}")
+        print(f"{name:<{width}}  " + "  ".join(cells))
+
+
+def save_results(path: str, results: dict[str, dict]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    spec = sys.modules["__main__"].__spec__
+    program = f"python -m {spec.name}" if spec else f"python {os.path.basename(sys.argv[0])}"
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "command": " ".join([program, *sys.argv[1:]]),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2)
+
+
+def compare(
+    results: dict[str, dict],
+    baseline_path: str,
+    tolerance: float,
+    metrics: tuple[str, ...] = ("p50_ms", "p95_ms"),
+    min_delta_ms: float = 0.0,
+) -> list[str]:
+    """
+    Returns a description of every metric more than `tolerance` (a fraction)
+    and more than `min_delta_ms` slower than in the baseline file. Benchmarks
+    missing from either side are ignored.
+    """
+    with open(baseline_path, "r") as file:
+        baseline = json.load(file)["results"]
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in metrics:
+            before, after = baseline[name].get(metric), result.get(metric)
+            if before and after is not None and after > max(before * (1 + tolerance), before + min_delta_ms):
+                regressions.append(f"{name} {metric}: {before:.2f} -> {after:.2f}")
+    return regressions
+
+
+def add_baseline_arguments(parser):
+    parser.add_argument("--save", metavar="PATH", help="Write the results to a baseline file")
+    parser.add_argument("--compare", metavar="PATH", help="Fail when slower than this baseline file")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)"
+    )
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this many milliseconds"
+    )
+
+
+def finish(results: dict[str, dict], args) -> int:
+    print_table(results)
+    if args.save:
+        save_results(args.save, results)
+        print(f"saved results to {args.save}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance, min_delta_ms=args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+    return 0
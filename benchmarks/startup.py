@@ -0,0 +1,61 @@
+"""
+Startup-time benchmark: imports the API in fresh interpreters and fails when
+the import is slower than the budget or loads the embedding model stack.
+
+    python -m benchmarks.startup --runs 5 --max-seconds 1.0
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers")
+
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="ai_assistant.api")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    results = [measure(args.module) for _ in range(args.runs)]
+    median = statistics.median(result["seconds"] for result in results)
+    heavy = sorted({name for result in results for name in result["heavy"]})
+
+    print(f"import {args.module}: median {median:.3f}s over {args.runs} runs")
+    failed = False
+    if heavy:
+        print(f"FAIL: import loaded heavy modules: {', '.join(heavy)}")
+        failed = True
+    if median > args.max_seconds:
+        print(f"FAIL: median import time above budget of {args.max_seconds:.3f}s")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from ai_assistant.postprocessors import strip_boilerplate
+
+
+def test_strips_glued_page_footers():
+    text = (
+        "Seek medical advice before travelling.\n"
+        "21-health-bol7.indd   35621-health-bol7.indd   356 9/12/09   17:50:569/12/09   17:50:56"
+    )
+    assert strip_boilerplate(text) == "Seek medical advice before travelling."
+
+
+def test_glued_footer_keeps_short_page_numbers():
+    text = "00-prelims-bol7.indd   400-prelims-bol7.indd   4 10/12/09   15:16:56"
+    assert strip_boilerplate(text) == ""
+
+
+def test_strips_section_page_footers():
+    text = "Altitude sickness 21-health-bol7.indd   Sec1:352 21-health-bol7.indd   Sec1:352 8/12/09   09:34:21"
+    assert strip_boilerplate(text) == "Altitude sickness"
+
+
+def test_strips_header_only_page():
+    text = (
+        "lonelyplanet.comLA PAZ62   LA P AZ\n"
+        "11-la-paz-bol7.indd   62 11-la-paz-bol7.indd   62 8/12/09   09:33:38 8/12/09   09:33:38"
+    )
+    assert strip_boilerplate(text) == ""
+
+
+def test_strips_running_header():
+    text = "lonelyplanet.comCENTRAL HIGHLANDSCENTRAL HIGHLANDS  ••  Sucre   213\nSucre is the capital."
+    assert strip_boilerplate(text) == "Sucre is the capital."